@@ -0,0 +1,159 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from metrics import metrics
+
+# serialized once, shedding a request shouldn't cost more than answering a PING
+BUSY_RESPONSE = JSONResponse(
+    {
+        "type": 4,
+        "data": {"content": "I'm a bit busy right now, try again.", "flags": 64},
+    },
+).body
+
+
+class ReceivedAtMiddleware:
+    """
+    Stamps requests with the time they reached the app, before the body is read,
+    verified and parsed, so queueing delay covers the time spent on all of that
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["received_at"] = time.monotonic()
+
+        await self.app(scope, receive, send)
+
+
+class AdmissionController:
+    """
+    Caps the number of interactions being handled at once. Requests past the cap
+    wait in line, unless the projected wait means they'd miss Discord's response
+    deadline anyway, in which case they're shed straight away.
+    """
+
+    def __init__(
+        self,
+        max_inflight: int,
+        deadline: float,
+        smoothing: float = 0.2,
+        shed_cooldown: float = 5.0,
+    ) -> None:
+        self.max_inflight = max_inflight
+        self.deadline = deadline
+        self.smoothing = smoothing
+        # how long after shedding a request we keep reporting not ready
+        self.shed_cooldown = shed_cooldown
+
+        self.inflight = 0
+        self.waiting = 0
+        # moving averages of handler run time and time spent waiting for a slot
+        self.service_time = 0.0
+        self.queue_delay = 0.0
+        self.last_shed: float | None = None
+        self._slots = asyncio.Semaphore(max_inflight)
+
+    def projected_wait(self) -> float:
+        if not self._slots.locked():
+            return 0.0
+
+        return (self.waiting + 1) * self.service_time / self.max_inflight
+
+    @property
+    def shedding(self) -> bool:
+        return (
+            self.last_shed is not None
+            and time.monotonic() - self.last_shed < self.shed_cooldown
+        )
+
+    @property
+    def ready(self) -> bool:
+        return not self.shedding and self.projected_wait() < self.deadline / 2
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "max_inflight": self.max_inflight,
+            "saturation": self.inflight / self.max_inflight,
+            "projected_wait": self.projected_wait(),
+            "service_time": self.service_time,
+            "queue_delay": self.queue_delay,
+            "shedding": self.shedding,
+        }
+
+    def _average(self, average: float, sample: float) -> float:
+        return average + self.smoothing * (sample - average)
+
+    def _shed(self, reason: str) -> None:
+        self.last_shed = time.monotonic()
+        metrics.inc("admission_shed_total", reason=reason)
+
+    async def _acquire(self, budget: float) -> bool:
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(budget):
+                await self._slots.acquire()
+        except TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+        return True
+
+    @asynccontextmanager
+    async def slot(self, received_at: float | None = None) -> AsyncIterator[bool]:
+        """
+        Yields whether the request was admitted, shed requests must answer without
+        doing any work
+        """
+        received_at = received_at or time.monotonic()
+
+        # only a request that has to queue can be shed, with a free slot it runs
+        # straight away however slow recent requests were. inflight can't tell,
+        # a released slot is handed to a waiter before that waiter counts itself
+        if not self._slots.locked():
+            # returns without waiting on a semaphore that isn't locked
+            await self._slots.acquire()
+        else:
+            # how long we can wait for a slot and still run the handler in time
+            elapsed = time.monotonic() - received_at
+            budget = self.deadline - elapsed - self.service_time
+
+            if budget <= 0 or self.projected_wait() > budget:
+                self._shed("projected_wait")
+                yield False
+                return
+
+            if not await self._acquire(budget):
+                self._shed("timeout")
+                yield False
+                return
+
+        started = time.monotonic()
+        delay = started - received_at
+        self.queue_delay = self._average(self.queue_delay, delay)
+        metrics.observe("admission_queue_seconds", delay)
+
+        self.inflight += 1
+        metrics.set("admission_inflight", self.inflight)
+        try:
+            yield True
+        finally:
+            self.inflight -= 1
+            metrics.set("admission_inflight", self.inflight)
+            # capped, one very slow request shouldn't push the average past what
+            # any request could take and still make the deadline
+            self.service_time = self._average(
+                self.service_time,
+                min(time.monotonic() - started, self.deadline),
+            )
+            self._slots.release()
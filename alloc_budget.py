@@ -0,0 +1,435 @@
+"""
+Allocation and timing budgets for the interaction hot path. Signed PING, slash
+command and component interactions are driven through the ASGI app under
+tracemalloc and compared against the checked in alloc_budget.json baseline.
+"""
+
+import gc
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from fastapi.responses import JSONResponse, Response
+from nacl.signing import SigningKey
+from pydantic import BaseModel
+from starlette.requests import Request
+
+import shh
+from depends import ValidateDiscordRequest
+from discord_api import DiscordInteraction
+from store import hidden_posts
+
+REPO_DIR = str(Path(__file__).parent)
+BASELINE_PATH = Path(REPO_DIR) / "alloc_budget.json"
+INTERACTIONS_PATH = "/discord/interactions"
+# frames kept per allocation, enough to see which of our lines caused it
+TRACE_DEPTH = 8
+# absolute slack on top of the relative tolerance, so tiny numbers aren't flaky
+PEAK_SLACK_BYTES = 2048
+BLOCK_SLACK = 4
+# lets the worker thread of the last store call finish freeing its work item,
+# block counts are process wide and it would land in whichever stage runs next
+SETTLE_SECONDS = 0.005
+# allowed growth over the baseline, relative, and for the time ratio
+TOLERANCE = 0.1
+TIME_TOLERANCE = 0.5
+
+
+class Measurement(BaseModel):
+    # bytes allocated on top of what was live before, at the highest point
+    peak_bytes: int
+    # blocks still allocated when the step finished, after a collection. Not a
+    # leak as such, a later request can free them
+    blocks: int
+
+
+class ScenarioResult(BaseModel):
+    request: Measurement
+    stages: dict[str, Measurement]
+    # request time as a multiple of a fixed calibration workload
+    time_ratio: float
+
+
+class SignedRequest(BaseModel):
+    body: bytes
+    headers: dict[str, str]
+
+
+def sign(signing_key: SigningKey, payload: dict) -> SignedRequest:
+    body = json.dumps(payload).encode()
+    timestamp = "1700000000"
+    signature = signing_key.sign(timestamp.encode() + body).signature
+
+    return SignedRequest(
+        body=body,
+        headers={
+            "content-type": "application/json",
+            "x-signature-ed25519": signature.hex(),
+            "x-signature-timestamp": timestamp,
+        },
+    )
+
+
+def build_scope(request: SignedRequest) -> dict:
+    headers = {**request.headers, "content-length": str(len(request.body))}
+
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": INTERACTIONS_PATH,
+        "raw_path": INTERACTIONS_PATH.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(name.encode(), value.encode()) for name, value in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("alloc-budget", 80),
+    }
+
+
+def receiver(request: SignedRequest):  # noqa: ANN201
+    messages = [{"type": "http.request", "body": request.body, "more_body": False}]
+
+    async def receive() -> dict:
+        if messages:
+            return messages.pop()
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+def clear_hot_caches() -> None:
+    """
+    Forget recent component results, otherwise every click after the first is
+    answered from the single flight hot cache and the reveal is never measured
+    """
+    for flight in shh.component_flights.values():
+        flight.clear()
+
+
+async def asgi_request(request: SignedRequest) -> int:
+    """
+    Send one request straight into the ASGI app, an HTTP client in the way would
+    allocate more than the app does
+    """
+    status = 0
+
+    async def send(message: dict) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await shh.app(build_scope(request), receiver(request), send)
+    return status
+
+
+class Tracker:
+    """
+    Measures the allocations between start() and stop(). Snapshots are slow on a
+    large heap, so they're only taken when asked for to explain a failure.
+    """
+
+    def __init__(self) -> None:
+        self.snapshots = False
+        self.before: tracemalloc.Snapshot | None = None
+
+    def start(self) -> None:
+        time.sleep(SETTLE_SECONDS)
+        gc.collect()
+        if self.snapshots:
+            self.before = tracemalloc.take_snapshot()
+        self.live_blocks = sys.getallocatedblocks()
+        self.live_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def stop(self) -> tuple[Measurement, list[tracemalloc.StatisticDiff]]:
+        time.sleep(SETTLE_SECONDS)
+        peak = tracemalloc.get_traced_memory()[1]
+        # cycles the request left behind aren't retained, only not collected yet
+        gc.collect()
+        blocks = sys.getallocatedblocks() - self.live_blocks
+
+        diff = []
+        if self.snapshots and self.before:
+            diff = tracemalloc.take_snapshot().compare_to(self.before, "traceback")
+
+        measurement = Measurement(peak_bytes=peak - self.live_bytes, blocks=blocks)
+        return measurement, diff
+
+
+def median(measurements: list[Measurement]) -> Measurement:
+    return Measurement(
+        peak_bytes=int(statistics.median(m.peak_bytes for m in measurements)),
+        blocks=int(statistics.median(m.blocks for m in measurements)),
+    )
+
+
+async def run_stages(
+    request: SignedRequest,
+    validator: ValidateDiscordRequest,
+    tracker: Tracker,
+) -> dict[str, tuple[Measurement, list[tracemalloc.StatisticDiff]]]:
+    """
+    Run the steps the endpoint goes through one at a time, so allocations can be
+    pinned on a stage
+    """
+    stages = {}
+
+    clear_hot_caches()
+    http_request = Request(build_scope(request), receiver(request))
+
+    tracker.start()
+    await validator(
+        http_request,
+        request.headers["x-signature-ed25519"],
+        request.headers["x-signature-timestamp"],
+    )
+    stages["verify"] = tracker.stop()
+
+    tracker.start()
+    interaction = DiscordInteraction.model_validate(json.loads(request.body))
+    stages["parse"] = tracker.stop()
+
+    tracker.start()
+    content = await shh.discord_interactions(interaction, http_request)
+    stages["dispatch"] = tracker.stop()
+
+    tracker.start()
+    if not isinstance(content, Response):
+        content = JSONResponse(content)
+    stages["serialize"] = tracker.stop()
+
+    return stages
+
+
+def calibration_workload() -> None:
+    """
+    Fixed pure python work, request times are compared relative to it so the
+    baseline holds on faster or slower machines
+    """
+    payload = {"values": list(range(200)), "names": [str(i) for i in range(200)]}
+    for _ in range(20):
+        json.loads(json.dumps(payload))
+
+
+async def time_ratio(request: SignedRequest, iterations: int) -> float:
+    request_times = []
+    calibration_times = []
+
+    for _ in range(iterations):
+        clear_hot_caches()
+        started = time.perf_counter_ns()
+        await asgi_request(request)
+        request_times.append(time.perf_counter_ns() - started)
+
+        started = time.perf_counter_ns()
+        calibration_workload()
+        calibration_times.append(time.perf_counter_ns() - started)
+
+    return statistics.median(request_times) / statistics.median(calibration_times)
+
+
+async def measure(
+    request: SignedRequest,
+    validator: ValidateDiscordRequest,
+    iterations: int,
+) -> tuple[ScenarioResult, dict[str, list[tracemalloc.StatisticDiff]]]:
+    # warm caches and lazy imports so they don't count against the request
+    for _ in range(5):
+        clear_hot_caches()
+        await asgi_request(request)
+
+    ratio = await time_ratio(request, iterations)
+
+    tracker = Tracker()
+    tracemalloc.start(TRACE_DEPTH)
+    try:
+        requests = []
+        for _ in range(iterations):
+            clear_hot_caches()
+            tracker.start()
+            await asgi_request(request)
+            requests.append(tracker.stop()[0])
+
+        stage_runs = [
+            await run_stages(request, validator, tracker) for _ in range(iterations)
+        ]
+
+        # one more run with snapshots, its diffs explain a failure
+        tracker.snapshots = True
+        last_run = await run_stages(request, validator, tracker)
+        diffs = {name: diff for name, (_, diff) in last_run.items()}
+    finally:
+        tracemalloc.stop()
+
+    stages = {
+        name: median([run[name][0] for run in stage_runs]) for name in stage_runs[0]
+    }
+    return (
+        ScenarioResult(request=median(requests), stages=stages, time_ratio=ratio),
+        diffs,
+    )
+
+
+def over_budget(current: int, baseline: int, tolerance: float, slack: int) -> bool:
+    return current > baseline * (1 + tolerance) + slack
+
+
+def check_scenario(
+    current: ScenarioResult,
+    baseline: ScenarioResult,
+    tolerance: float = TOLERANCE,
+    time_tolerance: float = TIME_TOLERANCE,
+) -> list[str]:
+    problems = []
+
+    for name, measurement in [("request", current.request), *current.stages.items()]:
+        expected = baseline.request if name == "request" else baseline.stages.get(name)
+        if expected is None:
+            continue
+
+        if over_budget(
+            measurement.peak_bytes,
+            expected.peak_bytes,
+            tolerance,
+            PEAK_SLACK_BYTES,
+        ):
+            problems.append(
+                f"{name}: peak {measurement.peak_bytes}B,"
+                f" budget {expected.peak_bytes}B",
+            )
+        if over_budget(measurement.blocks, expected.blocks, tolerance, BLOCK_SLACK):
+            problems.append(
+                f"{name}: {measurement.blocks} blocks, budget {expected.blocks}",
+            )
+
+    if current.time_ratio > baseline.time_ratio * (1 + time_tolerance):
+        problems.append(
+            f"time: {current.time_ratio:.2f}x calibration,"
+            f" baseline {baseline.time_ratio:.2f}x",
+        )
+
+    return problems
+
+
+def allocation_site(traceback: tracemalloc.Traceback) -> str:
+    """
+    The newest frame, plus the newest of our own frames that led to it
+    """
+    newest = traceback[-1]
+    site = f"{newest.filename}:{newest.lineno}"
+
+    for frame in reversed(traceback):
+        if frame.filename.startswith(REPO_DIR) and frame is not newest:
+            return f"{site} via {Path(frame.filename).name}:{frame.lineno}"
+
+    return site
+
+
+def stage_report(
+    current: ScenarioResult,
+    baseline: ScenarioResult | None,
+    diffs: dict[str, list[tracemalloc.StatisticDiff]],
+    top: int = 5,
+) -> list[str]:
+    lines = [f"  {'stage':<12}{'peak B':>10}{'base':>10}{'blocks':>8}{'base':>8}"]
+
+    for name, measurement in current.stages.items():
+        expected = baseline.stages.get(name) if baseline else None
+        lines.append(
+            f"  {name:<12}{measurement.peak_bytes:>10}"
+            f"{expected.peak_bytes if expected else '-':>10}"
+            f"{measurement.blocks:>8}{expected.blocks if expected else '-':>8}",
+        )
+
+    for name, diff in diffs.items():
+        allocations = [stat for stat in diff if stat.size_diff > 0][:top]
+        if not allocations:
+            continue
+
+        lines.append(f"  largest allocations in {name}:")
+        lines.extend(
+            f"    {stat.size_diff:>+8}B {stat.count_diff:>+5} blocks"
+            f"  {allocation_site(stat.traceback)}"
+            for stat in allocations
+        )
+
+    return lines
+
+
+async def build_scenarios(signing_key: SigningKey) -> dict[str, SignedRequest]:
+    post = await hidden_posts.create_post(content="alloc budget", author_id="1")
+
+    base = {
+        "application_id": "1",
+        "id": "2",
+        "token": "token",
+        "version": 1,
+        "user": {"id": "3"},
+    }
+    return {
+        "ping": sign(signing_key, {**base, "type": 1}),
+        "command": sign(
+            signing_key,
+            {
+                **base,
+                "type": 2,
+                "data": {
+                    "id": "4",
+                    "name": "shh",
+                    "type": 1,
+                    "options": [{"name": "message", "type": 3, "value": "hello"}],
+                },
+            },
+        ),
+        "component": sign(
+            signing_key,
+            {
+                **base,
+                "type": 3,
+                "data": {"custom_id": f"reveal:{post.id}", "component_type": 2},
+            },
+        ),
+    }
+
+
+async def run(iterations: int) -> dict[str, tuple[ScenarioResult, dict]]:
+    signing_key = SigningKey(bytes(32))
+    validator = ValidateDiscordRequest(signing_key.verify_key.encode().hex())
+    shh.app.dependency_overrides[shh.validate_discord_request] = validator
+    database_path = hidden_posts.path
+
+    with tempfile.TemporaryDirectory() as directory:
+        # keep the posts the scenarios create out of the real database
+        hidden_posts.close()
+        hidden_posts.path = str(Path(directory) / "alloc_budget.db")
+
+        try:
+            scenarios = await build_scenarios(signing_key)
+            return {
+                name: await measure(request, validator, iterations)
+                for name, request in scenarios.items()
+            }
+        finally:
+            hidden_posts.close()
+            hidden_posts.path = database_path
+            shh.app.dependency_overrides.pop(shh.validate_discord_request, None)
+
+
+def load_baseline() -> dict[str, ScenarioResult]:
+    if not BASELINE_PATH.exists():
+        return {}
+
+    raw = json.loads(BASELINE_PATH.read_text())
+    return {name: ScenarioResult(**result) for name, result in raw.items()}
+
+
+def save_baseline(results: dict[str, ScenarioResult]) -> None:
+    raw = {name: result.model_dump() for name, result in results.items()}
+    BASELINE_PATH.write_text(json.dumps(raw, indent=2) + "\n")
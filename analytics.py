@@ -0,0 +1,271 @@
+"""
+Per-interaction, per-guild usage counted in memory on the hot path and flushed as
+hourly rollups into the hidden post database on an interval.
+"""
+
+import asyncio
+import sqlite3
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
+
+from pydantic import BaseModel
+
+from helpers import configure_logging
+from store import HiddenPostStore
+
+logger = configure_logging(__name__)
+
+# upper bounds of the latency histogram buckets, the last bucket catches the rest
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+BUCKET_COLUMNS = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+# guild_id recorded for interactions outside a guild, like user installs in DMs
+NO_GUILD = "dm"
+# keys past this between flushes are folded into one overflow guild
+OVERFLOW_GUILD = "other"
+
+# counters per key: invocations, errors, latency sum, latency max, then buckets
+INVOCATIONS, ERRORS, LATENCY_SUM, LATENCY_MAX = range(4)
+FIRST_BUCKET = 4
+
+USAGE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS usage_rollups (
+    hour INTEGER NOT NULL,
+    interaction TEXT NOT NULL,
+    guild_id TEXT NOT NULL,
+    invocations INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    latency_sum REAL NOT NULL,
+    latency_max REAL NOT NULL,
+    {", ".join(f"{column} INTEGER NOT NULL" for column in BUCKET_COLUMNS)},
+    PRIMARY KEY (hour, interaction, guild_id)
+) WITHOUT ROWID;
+"""
+
+UPSERT_ROLLUP = f"""
+INSERT INTO usage_rollups
+    (hour, interaction, guild_id, invocations, errors, latency_sum, latency_max,
+     {", ".join(BUCKET_COLUMNS)})
+VALUES (?, ?, ?, ?, ?, ?, ?, {", ".join("?" for _ in BUCKET_COLUMNS)})
+ON CONFLICT (hour, interaction, guild_id) DO UPDATE SET
+    invocations = invocations + excluded.invocations,
+    errors = errors + excluded.errors,
+    latency_sum = latency_sum + excluded.latency_sum,
+    latency_max = max(latency_max, excluded.latency_max),
+    {", ".join(f"{column} = {column} + excluded.{column}" for column in BUCKET_COLUMNS)}
+"""
+
+UsageKey = tuple[int, str, str]
+
+
+def bucket_index(latency_ms: float) -> int:
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= bound:
+            return index
+
+    return len(LATENCY_BUCKETS_MS)
+
+
+def new_counters() -> list[float]:
+    return [0] * (FIRST_BUCKET + len(BUCKET_COLUMNS))
+
+
+class UsageCall:
+    """
+    Handed out by UsageRecorder.track(), set `error` when the interaction failed
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self) -> None:
+        self.error = False
+
+
+class UsageSummary(BaseModel):
+    interaction: str
+    guild_id: str
+    invocations: int
+    errors: int
+    latency_avg_ms: float
+    latency_p95_ms: float
+    latency_max_ms: float
+
+
+def percentile_bound(buckets: list[int], fraction: float, ceiling: float) -> float:
+    """
+    The upper bound of the histogram bucket the given fraction of calls fall under,
+    never more than `ceiling`, the slowest call seen
+    """
+    target = sum(buckets) * fraction
+    seen = 0
+
+    for bound, count in zip(LATENCY_BUCKETS_MS, buckets, strict=False):
+        seen += count
+        if seen >= target:
+            return min(bound, ceiling)
+
+    return ceiling
+
+
+class UsageRecorder:
+    """
+    Counts interactions into a dict of fixed size counter lists keyed on the hour,
+    the interaction and the guild. Recording does no I/O, a background task swaps
+    the dict out and upserts it into the usage_rollups table every interval and
+    once more on shutdown.
+    """
+
+    def __init__(
+        self,
+        store: HiddenPostStore,
+        interval: float = 60,
+        max_keys: int = 4096,
+    ) -> None:
+        self.store = store
+        self.interval = interval
+        self.max_keys = max_keys
+
+        self._counts: dict[UsageKey, list[float]] = {}
+        self._task: asyncio.Task | None = None
+
+    def record(
+        self,
+        interaction: str,
+        guild_id: str | None,
+        latency: float,
+        *,
+        error: bool = False,
+    ) -> None:
+        now = time.time()
+        key = (int(now // 3600) * 3600, interaction, guild_id or NO_GUILD)
+
+        counters = self._counts.get(key)
+        if counters is None:
+            if len(self._counts) >= self.max_keys:
+                key = (key[0], interaction, OVERFLOW_GUILD)
+            counters = self._counts.setdefault(key, new_counters())
+
+        latency_ms = latency * 1000
+        counters[INVOCATIONS] += 1
+        counters[ERRORS] += error
+        counters[LATENCY_SUM] += latency_ms
+        counters[LATENCY_MAX] = max(counters[LATENCY_MAX], latency_ms)
+        counters[FIRST_BUCKET + bucket_index(latency_ms)] += 1
+
+    @contextmanager
+    def track(self, interaction: str, guild_id: str | None) -> Iterator[UsageCall]:
+        call = UsageCall()
+        started = time.perf_counter()
+
+        try:
+            yield call
+        except Exception:
+            call.error = True
+            raise
+        finally:
+            self.record(
+                interaction,
+                guild_id,
+                time.perf_counter() - started,
+                error=call.error,
+            )
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+
+        self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.exception("Usage flush failed", exc_info=exc)
+
+    def _restore(self, pending: dict[UsageKey, list[float]]) -> None:
+        for key, counters in pending.items():
+            current = self._counts.setdefault(key, new_counters())
+            for index, value in enumerate(counters):
+                if index == LATENCY_MAX:
+                    current[index] = max(current[index], value)
+                else:
+                    current[index] += value
+
+    async def flush(self) -> None:
+        if not self._counts:
+            return
+
+        pending, self._counts = self._counts, {}
+        rows = [
+            (
+                *key,
+                int(counters[INVOCATIONS]),
+                int(counters[ERRORS]),
+                counters[LATENCY_SUM],
+                counters[LATENCY_MAX],
+                *(int(count) for count in counters[FIRST_BUCKET:]),
+            )
+            for key, counters in pending.items()
+        ]
+
+        def write(db: sqlite3.Connection) -> None:
+            db.execute(USAGE_SCHEMA)
+            db.executemany(UPSERT_ROLLUP, rows)
+
+        try:
+            await self.store.transaction(write)
+        except Exception:
+            # keep the counts for the next flush rather than losing them
+            self._restore(pending)
+            raise
+
+        logger.debug("Flushed %s usage rollups", len(rows))
+
+
+async def query_usage(
+    store: HiddenPostStore,
+    since: float,
+    group_by: str = "interaction",
+) -> list[UsageSummary]:
+    """
+    Sum the rollups since `since`, per interaction, or per interaction and guild
+    """
+    group = "interaction, guild_id" if group_by == "guild" else "interaction"
+    guild_column = "guild_id" if group_by == "guild" else "'*'"
+    bucket_sums = ", ".join(f"sum({column})" for column in BUCKET_COLUMNS)
+
+    def read(db: sqlite3.Connection) -> list[sqlite3.Row]:
+        db.execute(USAGE_SCHEMA)
+        return db.execute(
+            f"SELECT interaction, {guild_column} AS guild_id,"  # noqa: S608
+            " sum(invocations), sum(errors), sum(latency_sum), max(latency_max),"
+            f" {bucket_sums}"
+            f" FROM usage_rollups WHERE hour >= ? GROUP BY {group}"
+            " ORDER BY sum(invocations) DESC",
+            (int(since // 3600) * 3600,),
+        ).fetchall()
+
+    summaries = []
+    for row in await store.transaction(read):
+        interaction, guild_id, invocations, errors, latency_sum, latency_max = row[:6]
+        summaries.append(
+            UsageSummary(
+                interaction=interaction,
+                guild_id=guild_id,
+                invocations=invocations,
+                errors=errors,
+                latency_avg_ms=latency_sum / invocations,
+                latency_p95_ms=percentile_bound(list(row[6:]), 0.95, latency_max),
+                latency_max_ms=latency_max,
+            ),
+        )
+
+    return summaries
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import IO
+
+import httpx
+
+from config import attachment_max_bytes, blob_dir
+from discord_api import Attachment
+from helpers import configure_logging
+from metrics import metrics
+from store import StoredBlob
+
+logger = configure_logging(__name__)
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+# raster images only, anything a browser could run (html, svg) is refused
+ALLOWED_CONTENT_TYPES = frozenset(
+    ("image/png", "image/jpeg", "image/gif", "image/webp"),
+)
+
+
+def normalize_content_type(content_type: str | None) -> str:
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+class AttachmentTooLargeError(Exception):
+    """
+    Raise when an attachment is bigger than we're willing to store
+    """
+
+    def __init__(self, size: int, max_bytes: int) -> None:
+        super().__init__(f"Attachment is over the {max_bytes} byte limit ({size})")
+        self.size = size
+        self.max_bytes = max_bytes
+
+
+class UnsupportedAttachmentError(Exception):
+    """
+    Raise when an attachment isn't one of the image types we store
+    """
+
+    def __init__(self, content_type: str | None) -> None:
+        super().__init__(f"Attachments must be png, jpeg, gif or webp ({content_type})")
+        self.content_type = content_type
+
+
+class BlobStore:
+    """
+    Content addressed file storage. Downloads stream into a temp file while being
+    hashed, then get renamed to their sha256 digest, so identical uploads are
+    only stored once and no attachment is ever held in memory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        chunk_size: int = 64 * 1024,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        # orders dedup hits against the sweeper removing the same file
+        self._lock = threading.Lock()
+
+    def path(self, digest: str) -> Path:
+        if not DIGEST_PATTERN.match(digest):
+            msg = f"Not a sha256 digest: {digest}"
+            raise ValueError(msg)
+
+        return self.directory / digest[:2] / digest
+
+    def _open_spool(self) -> IO[bytes]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # spool next to the blobs so the final rename stays on one filesystem
+        # closed by download(), once the content is in
+        return tempfile.NamedTemporaryFile(  # noqa: SIM115
+            dir=self.directory,
+            prefix=".spool-",
+            delete=False,
+        )
+
+    def _commit(self, spool_path: Path, digest: str) -> None:
+        blob_path = self.path(digest)
+
+        with self._lock:
+            if blob_path.exists():
+                metrics.inc("blob_dedup_hits_total")
+                # a fresh mtime tells the sweeper the file is wanted again
+                os.utime(blob_path)
+                spool_path.unlink()
+            else:
+                blob_path.parent.mkdir(exist_ok=True)
+                spool_path.replace(blob_path)
+
+    def remove(self, digest: str, older_than: float) -> bool:
+        """
+        Remove a blob's file, unless the same content was stored again since
+        `older_than`. Its row is already gone by then, but an upload that was
+        deduplicated against the file is about to add it back.
+        """
+        blob_path = self.path(digest)
+
+        with self._lock:
+            try:
+                if blob_path.stat().st_mtime >= older_than:
+                    return False
+                blob_path.unlink()
+            except FileNotFoundError:
+                return False
+
+        return True
+
+    async def download(self, client: httpx.AsyncClient, url: str) -> tuple[str, int]:
+        """
+        Stream `url` into the store, returning the digest and size of the content
+        """
+        digest = hashlib.sha256()
+        size = 0
+        spool = await asyncio.to_thread(self._open_spool)
+
+        try:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+
+                content_length = int(response.headers.get("content-length", 0))
+                if content_length > self.max_bytes:
+                    raise AttachmentTooLargeError(content_length, self.max_bytes)  # noqa: TRY301
+
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AttachmentTooLargeError(size, self.max_bytes)  # noqa: TRY301
+
+                    digest.update(chunk)
+                    spool.write(chunk)
+
+            spool.close()
+            await asyncio.to_thread(self._commit, Path(spool.name), digest.hexdigest())
+        except BaseException:
+            spool.close()
+            Path(spool.name).unlink(missing_ok=True)
+            raise
+
+        metrics.inc("blob_downloaded_bytes_total", size)
+        return digest.hexdigest(), size
+
+    def check(self, attachment: Attachment) -> None:
+        """
+        Refuse an attachment from what Discord tells us about it, before
+        downloading anything
+        """
+        if attachment.size > self.max_bytes:
+            raise AttachmentTooLargeError(attachment.size, self.max_bytes)
+
+        if normalize_content_type(attachment.content_type) not in ALLOWED_CONTENT_TYPES:
+            raise UnsupportedAttachmentError(attachment.content_type)
+
+    async def ingest(
+        self,
+        client: httpx.AsyncClient,
+        attachment: Attachment,
+    ) -> StoredBlob:
+        self.check(attachment)
+
+        digest, size = await self.download(client, attachment.url)
+        logger.debug("Stored attachment %s as %s", attachment.id, digest)
+
+        return StoredBlob(
+            digest=digest,
+            size=size,
+            content_type=normalize_content_type(attachment.content_type),
+        )
+
+
+blob_store = BlobStore(blob_dir, attachment_max_bytes)
+download_client = httpx.AsyncClient(
+    follow_redirects=True,
+    timeout=httpx.Timeout(10, read=30),
+)
@@ -0,0 +1,264 @@
+import gzip
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from helpers import configure_logging
+from metrics import metrics
+
+logger = configure_logging(__name__)
+
+# user fields that identify a person, dropped from captured payloads
+USER_PII_FIELDS = ("username", "global_name", "nick", "avatar", "banner", "email")
+# keys holding a user object anywhere in a payload, like a message's author
+USER_OBJECT_KEYS = ("user", "author", "target_user")
+# key of the installing user in authorizing_integration_owners
+USER_INSTALL_OWNER = "1"
+# option and command types that carry a user id or free text
+STRING_OPTION = 3
+USER_OPTION = 6
+MENTIONABLE_OPTION = 9
+USER_COMMAND = 2
+# links to attachments and embedded images lead straight to hidden content, and
+# their names and captions can give it away
+LINK_FIELDS = ("url", "proxy_url")
+MEDIA_TEXT_FIELDS = ("filename", "title", "description")
+REDACTED_URL = "https://redacted.invalid/"
+
+
+def _pseudonym(user_id: str, salt: bytes) -> str:
+    """
+    Stable stand-in for a user id, so a capture keeps its mix of repeat users
+    without storing who they are
+    """
+    digest = hashlib.sha256(salt + user_id.encode()).digest()
+    return str(int.from_bytes(digest[:7], "big"))
+
+
+def _placeholder(text: str) -> str:
+    """
+    Text of the same length, hidden posts shouldn't be readable from a capture
+    but replays should still page the same way
+    """
+    return "x" * len(text)
+
+
+def _redact_user(user: dict, salt: bytes) -> None:
+    if "id" in user:
+        user["id"] = _pseudonym(str(user["id"]), salt)
+
+    for field in USER_PII_FIELDS:
+        user.pop(field, None)
+
+
+def _redact_field(key: str, value: object, salt: bytes) -> None:
+    if key in {*USER_OBJECT_KEYS, "member"} and isinstance(value, dict):
+        _redact_user(value, salt)
+    elif key == "mentions" and isinstance(value, list):
+        for user in value:
+            if isinstance(user, dict):
+                _redact_user(user, salt)
+    elif (
+        key == "authorizing_integration_owners"
+        and isinstance(value, dict)
+        and USER_INSTALL_OWNER in value
+    ):
+        value[USER_INSTALL_OWNER] = _pseudonym(str(value[USER_INSTALL_OWNER]), salt)
+
+
+def _redact_users(node: object, salt: bytes) -> None:
+    """
+    Pseudonymize user objects wherever they are nested, message authors and
+    mentions, interaction metadata and integration owners included
+    """
+    if isinstance(node, list):
+        for item in node:
+            _redact_users(item, salt)
+    elif isinstance(node, dict):
+        for key, value in node.items():
+            _redact_field(key, value, salt)
+            _redact_users(value, salt)
+
+
+def _redact_media(node: object) -> None:
+    """
+    Replace links and attachment or embed text wherever they are nested, resolved
+    attachments and the embeds of a revealed post included
+    """
+    if isinstance(node, list):
+        for item in node:
+            _redact_media(item)
+    elif isinstance(node, dict):
+        for key, value in node.items():
+            if key in LINK_FIELDS and isinstance(value, str):
+                node[key] = REDACTED_URL
+            elif key in MEDIA_TEXT_FIELDS and isinstance(value, str):
+                node[key] = _placeholder(value)
+            else:
+                _redact_media(value)
+
+
+def _redact_options(options: list | None, user_ids: set[str], salt: bytes) -> None:
+    for option in options or []:
+        value = option.get("value")
+        option_type = option.get("type")
+
+        if option_type == USER_OPTION or (
+            option_type == MENTIONABLE_OPTION and str(value) in user_ids
+        ):
+            option["value"] = _pseudonym(str(value), salt)
+        elif option_type == STRING_OPTION and isinstance(value, str):
+            option["value"] = _placeholder(value)
+
+        _redact_options(option.get("options"), user_ids, salt)
+
+
+def redact(payload: dict, salt: bytes) -> dict:
+    """
+    Strip the interaction token, message text and links to attachments, and
+    replace every user id in a raw interaction payload
+    """
+    if "token" in payload:
+        payload["token"] = "redacted"  # noqa: S105
+
+    _redact_users(payload, salt)
+    _redact_media(payload)
+
+    message = payload.get("message")
+    if isinstance(message, dict) and isinstance(message.get("content"), str):
+        message["content"] = _placeholder(message["content"])
+
+    data = payload.get("data") or {}
+    resolved = data.get("resolved") or {}
+    _redact_options(data.get("options"), set(resolved.get("users") or {}), salt)
+
+    if data.get("type") == USER_COMMAND and "target_id" in data:
+        data["target_id"] = _pseudonym(str(data["target_id"]), salt)
+
+    for key in ("users", "members"):
+        if isinstance(resolved.get(key), dict):
+            resolved[key] = {
+                _pseudonym(user_id, salt): value
+                for user_id, value in resolved[key].items()
+            }
+            for value in resolved[key].values():
+                if isinstance(value, dict):
+                    _redact_user(value.get("user", value), salt)
+
+    return payload
+
+
+class TrafficCapture:
+    """
+    Samples verified interaction bodies and writes them, redacted, to rotating
+    gzipped JSONL files. Requests only pay for a random draw and a queue put,
+    parsing, redaction and disk I/O happen on a writer thread.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float = 0.01,
+        max_file_bytes: int = 64 * 1024 * 1024,
+        max_files: int = 20,
+        queue_size: int = 1000,
+    ) -> None:
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+
+        self._queue: queue.Queue[tuple[float, bytes] | None] = queue.Queue(queue_size)
+        self._salt = os.urandom(16)
+        self._writer: threading.Thread | None = None
+
+    def submit(self, body: bytes) -> None:
+        if random.random() >= self.sample_rate:  # noqa: S311
+            return
+
+        try:
+            self._queue.put_nowait((time.time(), body))
+        except queue.Full:
+            metrics.inc("capture_dropped_total")
+
+    def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._writer = threading.Thread(
+            target=self._write,
+            name="traffic-capture",
+            daemon=True,
+        )
+        self._writer.start()
+        logger.info(
+            "Capturing %.1f%% of interactions to %s",
+            self.sample_rate * 100,
+            self.directory,
+        )
+
+    def stop(self) -> None:
+        if self._writer:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _open_file(self) -> gzip.GzipFile:
+        path = self.directory / f"capture-{time.time_ns()}.jsonl.gz"
+
+        # keep the newest files, including the one we're about to open
+        existing = sorted(self.directory.glob("capture-*.jsonl.gz"))
+        for old_file in existing[: max(len(existing) - self.max_files + 1, 0)]:
+            old_file.unlink(missing_ok=True)
+
+        return gzip.open(path, "wb")  # noqa: SIM115
+
+    def _write(self) -> None:
+        capture_file = None
+        written = 0
+
+        while (item := self._queue.get()) is not None:
+            captured_at, body = item
+
+            try:
+                payload = redact(json.loads(body), self._salt)
+            except (ValueError, AttributeError):
+                metrics.inc("capture_dropped_total")
+                continue
+
+            line = json.dumps({"ts": captured_at, "body": payload}).encode() + b"\n"
+
+            if capture_file is None or written >= self.max_file_bytes:
+                if capture_file:
+                    capture_file.close()
+                capture_file = self._open_file()
+                written = 0
+
+            capture_file.write(line)
+            written += len(line)
+            metrics.inc("capture_written_total")
+
+        if capture_file:
+            capture_file.close()
+
+
+def read_capture(paths: list[Path]) -> Iterator[dict]:
+    """
+    Yield captured records from capture files or directories in capture order
+    """
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(path.glob("capture-*.jsonl.gz"))
+        else:
+            files.append(path)
+
+    for capture_file in sorted(files):
+        with gzip.open(capture_file, "rt") as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
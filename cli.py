@@ -1,12 +1,23 @@
 #!/usr/bin/env python3
 
+import asyncio
 import json
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
 from time import sleep
 
 import httpx
 import typer
+import uvicorn
+from nacl.signing import SigningKey
 
-from config import application_id, discord_token
+from capture import read_capture
+from config import application_id, discord_api_base_url, discord_token
+from discord_api import InteractionTypes
+from discord_emulator import EmulatorSettings, build_app
 from helpers import configure_logging
 from interactions.commands import (
     get_command_locations,
@@ -58,9 +69,8 @@ class RateLimit(httpx.BaseTransport):
 
 
 transport = RateLimit()
-base_url = "https://discord.com/api/v10"
 api_client = httpx.Client(
-    base_url=base_url,
+    base_url=discord_api_base_url,
     headers={"Authorization": f"Bot {discord_token}"},
     transport=transport,
 )
@@ -149,5 +159,409 @@ def delete_global_commands() -> None:
     print(f"Removed {len(command_json)} global commands")
 
 
+def sign_payload(signing_key: SigningKey, body: bytes) -> dict[str, str]:
+    timestamp = str(int(time.time()))
+    signature = signing_key.sign(timestamp.encode() + body).signature
+
+    return {
+        "Content-Type": "application/json",
+        "X-Signature-Ed25519": signature.hex(),
+        "X-Signature-Timestamp": timestamp,
+    }
+
+
+def print_latency_report(
+    latencies: dict[str, list[float]],
+    errors: int,
+    rate_limited: int = 0,
+) -> None:
+    print("latency in milliseconds")
+    print(f"{'type':<32}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+
+    for name, samples in sorted(latencies.items()):
+        if len(samples) > 1:
+            cuts = statistics.quantiles(samples, n=100, method="inclusive")
+            p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+        else:
+            p50 = p90 = p99 = samples[0]
+
+        print(
+            f"{name:<32}{len(samples):>8}"
+            f"{p50:>10.1f}{p90:>10.1f}{p99:>10.1f}{max(samples):>10.1f}",
+        )
+
+    print(f"{errors} requests returned an error status")
+    if rate_limited:
+        print(f"{rate_limited} requests were rate limited and retried")
+
+
+def stub_discord(request: httpx.Request) -> httpx.Response:
+    """
+    Stands in for Discord and its CDN during an in-process replay, redacted
+    attachments download as an empty PNG and follow up messages are dropped
+    """
+    if request.method == "GET":
+        return httpx.Response(
+            200,
+            content=b"\x89PNG\r\n\x1a\n",
+            headers={"content-type": "image/png"},
+        )
+
+    return httpx.Response(200, json={})
+
+
+async def replay(
+    records: list[dict],
+    client: httpx.AsyncClient,
+    signing_key: SigningKey,
+    speed: float,
+) -> tuple[dict[str, list[float]], int]:
+    latencies = defaultdict(list)
+    errors = 0
+
+    async def send(payload: dict) -> None:
+        nonlocal errors
+        body = json.dumps(payload).encode()
+
+        started = time.perf_counter()
+        response = await client.post(
+            "/discord/interactions",
+            content=body,
+            headers=sign_payload(signing_key, body),
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if response.is_error:
+            errors += 1
+
+        name = InteractionTypes(payload["type"]).name
+        data = payload.get("data") or {}
+        if "name" in data or "custom_id" in data:
+            name = f"{name}:{data.get('name') or data['custom_id'].split(':')[0]}"
+        latencies[name].append(elapsed_ms)
+
+    first_ts = records[0]["ts"]
+    started = time.monotonic()
+    requests = []
+
+    for record in records:
+        # keep the captured arrival pattern, compressed by `speed`
+        if speed > 0:
+            delay = (record["ts"] - first_ts) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        requests.append(asyncio.create_task(send(record["body"])))
+
+    await asyncio.gather(*requests)
+    return latencies, errors
+
+
+@app.command()
+def replay_capture(
+    paths: list[Path],
+    url: str | None = None,
+    speed: float = 1.0,
+    signing_key: str | None = None,
+) -> None:
+    """
+    Replay captured interactions against the app, in-process unless --url is given.
+    A --speed of 0 sends every request as fast as possible.
+    """
+    records = list(read_capture(paths))
+    if not records:
+        print("No captured interactions found")
+        raise typer.Exit(code=1)
+
+    if signing_key:
+        key = SigningKey(bytes.fromhex(signing_key))
+    elif url:
+        print("--signing-key is required to replay against a running server")
+        raise typer.Exit(code=1)
+    else:
+        key = SigningKey.generate()
+
+    print(f"Replaying {len(records)} interactions signed for public key")
+    print(key.verify_key.encode().hex())
+
+    if url:
+        client = httpx.AsyncClient(base_url=url)
+    else:
+        # imported here so the cli doesn't build the app unless it needs it
+        import shh
+        from depends import ValidateDiscordRequest
+
+        shh.app.dependency_overrides[shh.validate_discord_request] = (
+            ValidateDiscordRequest(key.verify_key.encode().hex())
+        )
+        client = httpx.AsyncClient(
+            base_url="http://shh",
+            transport=httpx.ASGITransport(app=shh.app),
+        )
+
+    async def run() -> tuple[dict[str, list[float]], int]:
+        async with client:
+            return await replay(records, client, key, speed)
+
+    if url:
+        latencies, errors = asyncio.run(run())
+    else:
+        from attachments import blob_store
+        from followup import followups
+        from interactions import commands
+        from store import hidden_posts
+
+        # nothing a replayed command does may reach Discord or its CDN
+        stub = httpx.AsyncClient(
+            base_url="http://discord.invalid",
+            transport=httpx.MockTransport(stub_discord),
+        )
+        commands.download_client = stub
+        followups.client = stub
+
+        async def run_in_process() -> tuple[dict[str, list[float]], int]:
+            try:
+                return await run()
+            finally:
+                # let deferred commands finish before the loop goes away
+                await followups.close()
+
+        # posts and attachments created by the replayed commands are thrown away
+        with tempfile.TemporaryDirectory() as directory:
+            hidden_posts.close()
+            hidden_posts.path = str(Path(directory) / "replay.db")
+            blob_store.directory = Path(directory) / "blobs"
+            try:
+                latencies, errors = asyncio.run(run_in_process())
+            finally:
+                hidden_posts.close()
+
+    print_latency_report(latencies, errors)
+
+
+@app.command()
+def run_emulator(  # noqa: PLR0913
+    host: str = "127.0.0.1",
+    port: int = 8001,
+    rate_limit: int = 5,
+    rate_window: float = 1.0,
+    global_rate_limit: int = 50,
+    latency_ms: float = 0,
+    latency_jitter_ms: float = 0,
+    error_rate: float = 0,
+) -> None:
+    """
+    Serve the local Discord API emulator, set DISCORD_API_BASE_URL to
+    http://HOST:PORT/api/v10 to use it
+    """
+    settings = EmulatorSettings(
+        rate_limit=rate_limit,
+        rate_window=rate_window,
+        global_rate_limit=global_rate_limit,
+        latency_ms=latency_ms,
+        latency_jitter_ms=latency_jitter_ms,
+        error_rate=error_rate,
+    )
+    uvicorn.run(build_app(settings), host=host, port=port)
+
+
+async def benchmark_requests(
+    client: httpx.AsyncClient,
+    command_count: int,
+    followup_count: int,
+    concurrency: int,
+) -> tuple[dict[str, list[float]], int, int]:
+    latencies = defaultdict(list)
+    errors = 0
+    rate_limited = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def call(name: str, method: str, url: str, **kwargs: object) -> None:
+        nonlocal errors, rate_limited
+
+        async with limit:
+            # latency includes time spent waiting out rate limits
+            started = time.perf_counter()
+            while True:
+                response = await client.request(method, url, **kwargs)
+                if response.status_code != httpx.codes.TOO_MANY_REQUESTS:
+                    break
+
+                rate_limited += 1
+                await asyncio.sleep(response.json().get("retry_after", 1))
+            latencies[name].append((time.perf_counter() - started) * 1000)
+
+        if response.is_error:
+            errors += 1
+
+    _, global_commands = get_command_locations()
+    commands = [
+        {**global_commands[index % len(global_commands)], "name": f"bench-{index}"}
+        for index in range(command_count)
+    ]
+
+    started = time.perf_counter()
+    for command in commands:
+        await call(
+            "deploy: create",
+            "POST",
+            f"/applications/{application_id}/commands",
+            json=command,
+        )
+    await call(
+        "deploy: bulk overwrite",
+        "PUT",
+        f"/applications/{application_id}/commands",
+        json=commands,
+    )
+    print(f"Deployed {command_count} commands in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *[
+            call(
+                "follow-up",
+                "POST",
+                f"/webhooks/{application_id}/bench-token-{index % concurrency}",
+                json={"content": f"follow-up {index}"},
+            )
+            for index in range(followup_count)
+        ],
+    )
+    elapsed = time.perf_counter() - started
+    print(
+        f"Sent {followup_count} follow-ups in {elapsed:.2f}s"
+        f" ({followup_count / elapsed:.1f}/s)",
+    )
+
+    return latencies, errors, rate_limited
+
+
+@app.command()
+def benchmark_emulator(  # noqa: PLR0913
+    commands: int = 25,
+    followups: int = 200,
+    concurrency: int = 10,
+    url: str | None = None,
+    rate_limit: int = 5,
+    rate_window: float = 1.0,
+    latency_ms: float = 0,
+    error_rate: float = 0,
+) -> None:
+    """
+    Benchmark command deploys and follow-ups against the Discord API emulator,
+    in-process unless --url points at a running one
+    """
+    headers = {"Authorization": f"Bot {discord_token}"}
+
+    if url:
+        client = httpx.AsyncClient(base_url=url, headers=headers)
+    else:
+        settings = EmulatorSettings(
+            rate_limit=rate_limit,
+            rate_window=rate_window,
+            latency_ms=latency_ms,
+            error_rate=error_rate,
+        )
+        client = httpx.AsyncClient(
+            base_url="http://emulator/api/v10",
+            headers=headers,
+            transport=httpx.ASGITransport(app=build_app(settings)),
+        )
+
+    async def run() -> tuple[dict[str, list[float]], int, int]:
+        async with client:
+            return await benchmark_requests(client, commands, followups, concurrency)
+
+    latencies, errors, rate_limited = asyncio.run(run())
+    print_latency_report(latencies, errors, rate_limited)
+
+
+@app.command()
+def check_alloc_budget(
+    iterations: int = 30,
+    tolerance: float = 0.1,
+    time_tolerance: float = 0.5,
+    update: bool = False,  # noqa: FBT001, FBT002
+) -> None:
+    """
+    Check the per-request allocation and timing budgets in alloc_budget.json,
+    exiting non-zero with a per-stage breakdown when one is exceeded
+    """
+    # imported here so the cli doesn't build the app unless it needs it
+    import alloc_budget
+
+    results = asyncio.run(alloc_budget.run(iterations))
+
+    if update:
+        alloc_budget.save_baseline(
+            {name: result for name, (result, _) in results.items()},
+        )
+        print(f"Updated {alloc_budget.BASELINE_PATH}")
+        return
+
+    baseline = alloc_budget.load_baseline()
+    failed = False
+
+    for name, (result, diffs) in results.items():
+        expected = baseline.get(name)
+        if expected:
+            problems = alloc_budget.check_scenario(
+                result,
+                expected,
+                tolerance,
+                time_tolerance,
+            )
+        else:
+            problems = ["no baseline, run with --update"]
+
+        print(
+            f"{name}: peak {result.request.peak_bytes}B,"
+            f" {result.request.blocks} blocks live after,"
+            f" {result.time_ratio:.2f}x calibration time"
+            f" {'FAIL' if problems else 'ok'}",
+        )
+
+        if problems:
+            failed = True
+            for problem in problems:
+                print(f"  {problem}")
+            for line in alloc_budget.stage_report(result, expected, diffs):
+                print(line)
+
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def usage(hours: int = 24, by_guild: bool = False) -> None:  # noqa: FBT001, FBT002
+    """
+    Show interaction usage from the hourly rollups, reveals are the reveal rows and
+    page turns the reveal_page rows
+    """
+    from analytics import query_usage
+    from store import hidden_posts
+
+    summaries = asyncio.run(
+        query_usage(
+            hidden_posts,
+            since=time.time() - hours * 3600,
+            group_by="guild" if by_guild else "interaction",
+        ),
+    )
+
+    print(
+        f"{'interaction':<16}{'guild':<22}{'calls':>8}{'errors':>8}"
+        f"{'avg ms':>9}{'p95 ms':>9}{'max ms':>9}",
+    )
+    for summary in summaries:
+        print(
+            f"{summary.interaction:<16}{summary.guild_id:<22}"
+            f"{summary.invocations:>8}{summary.errors:>8}"
+            f"{summary.latency_avg_ms:>9.1f}{summary.latency_p95_ms:>9.1f}"
+            f"{summary.latency_max_ms:>9.1f}",
+        )
+
+
 if __name__ == "__main__":
     app()
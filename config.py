@@ -7,3 +7,53 @@ load_dotenv()
 discord_public_key = os.getenv("DISCORD_PUBLIC_KEY", "default_value_if_not_set")
 discord_token = os.getenv("DISCORD_TOKEN", "default_value_if_not_set")
 application_id = os.getenv("APPLICATION_ID", "default_value_if_not_set")
+# point this at discord_emulator.py to run without the real API
+discord_api_base_url = os.getenv(
+    "DISCORD_API_BASE_URL",
+    "https://discord.com/api/v10",
+)
+
+# event loop stall detection, see loop_monitor.py
+loop_watchdog_enabled = os.getenv("LOOP_WATCHDOG_ENABLED", "false").lower() == "true"
+loop_stall_threshold_ms = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+
+# sampled capture of verified interaction payloads, see capture.py
+capture_enabled = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+capture_sample_rate = float(os.getenv("CAPTURE_SAMPLE_RATE", "0.01"))
+capture_dir = os.getenv("CAPTURE_DIR", "captures")
+capture_max_file_bytes = int(os.getenv("CAPTURE_MAX_FILE_BYTES", "67108864"))
+capture_max_files = int(os.getenv("CAPTURE_MAX_FILES", "20"))
+
+# bearer token for the /admin routes, they are disabled while this is empty
+admin_token = os.getenv("ADMIN_TOKEN", "")
+
+# sampling profiler, see profiler.py
+profile_sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+profile_command = os.getenv("PROFILE_COMMAND") or None
+profile_dir = os.getenv("PROFILE_DIR", "profiles")
+profile_interval_ms = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# hidden post storage
+database_path = os.getenv("DATABASE_PATH", "shh.db")
+blob_dir = os.getenv("BLOB_DIR", "blobs")
+attachment_max_bytes = int(os.getenv("ATTACHMENT_MAX_BYTES", "10485760"))
+# how long a hidden post can be revealed for
+post_ttl_seconds = float(os.getenv("POST_TTL_SECONDS", "86400"))
+# where Discord can reach this app, used for attachment links
+public_url = os.getenv("PUBLIC_URL", "http://localhost:8000")
+
+# admission control, see admission.py
+admission_max_inflight = int(os.getenv("ADMISSION_MAX_INFLIGHT", "64"))
+# Discord gives us 3 seconds to respond, keep some of that for the network
+interaction_deadline_ms = int(os.getenv("INTERACTION_DEADLINE_MS", "2500"))
+
+# expiry sweeper and compaction, see sweeper.py
+sweep_interval_seconds = float(os.getenv("SWEEP_INTERVAL_SECONDS", "60"))
+sweep_batch_size = int(os.getenv("SWEEP_BATCH_SIZE", "200"))
+sweep_time_budget_ms = int(os.getenv("SWEEP_TIME_BUDGET_MS", "250"))
+# UTC hours, start inclusive and end exclusive, compaction only runs in between
+compaction_window = os.getenv("COMPACTION_WINDOW", "3-5")
+compaction_pages = int(os.getenv("COMPACTION_PAGES", "1024"))
+
+# how often in-memory usage counts are written out as hourly rollups, see analytics.py
+usage_flush_seconds = float(os.getenv("USAGE_FLUSH_SECONDS", "60"))
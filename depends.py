@@ -1,13 +1,21 @@
+import hmac
 from typing import Annotated
 
 from fastapi import Header, HTTPException, Request
 from nacl.exceptions import BadSignatureError
 from nacl.signing import VerifyKey
 
+from capture import TrafficCapture
+
 
 class ValidateDiscordRequest:
-    def __init__(self, public_key: str) -> None:
+    def __init__(
+        self,
+        public_key: str,
+        capture: TrafficCapture | None = None,
+    ) -> None:
         self.public_key = public_key
+        self.capture = capture
 
     async def __call__(
         self,
@@ -26,3 +34,27 @@ class ValidateDiscordRequest:
             )
         except BadSignatureError:
             raise HTTPException(status_code=401, detail="invalid request signature")
+
+        if self.capture:
+            self.capture.submit(body)
+
+
+class ValidateAdminRequest:
+    """
+    Bearer token check for the admin routes, which are disabled while no
+    token is configured
+    """
+
+    def __init__(self, token: str) -> None:
+        self.token = token
+
+    async def __call__(self, authorization: Annotated[str, Header()] = "") -> None:
+        if not self.token:
+            raise HTTPException(status_code=404, detail="admin routes are disabled")
+
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(
+            token.encode(),
+            self.token.encode(),
+        ):
+            raise HTTPException(status_code=401, detail="invalid admin token")
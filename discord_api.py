@@ -3,6 +3,8 @@ from enum import Enum, IntEnum
 
 from pydantic import BaseModel
 
+from response_cache import ResponseCachePolicy
+
 
 class ApplicationCommandType(IntEnum):
     CHAT_INPUT = 1
@@ -201,40 +203,26 @@ class ResolvedMessageObjectMap(BaseModel):
     messages: dict[str, Message]
 
 
-class ApplicationCommandData(BaseModel):
+class Attachment(BaseModel):
     """
-    Discord Interaction data from commands
-    https://discord.com/developers/docs/interactions/receiving-and-responding#interaction-object-interaction-data
+    A file attached to a message or passed to an ATTACHMENT option
+    https://discord.com/developers/docs/resources/message#attachment-object
     """
 
     id: str
-    name: str
-    type: int
-    resolved: ResolvedMessageObjectMap | None = None
-    options: list[InteractionOption] | None = None
-    guild_id: str | None = None
-    target_id: str | None = None
-
-    def get_option(
-        self,  # noqa: ANN101
-        name: str,
-    ) -> InteractionOption | None:
-        if self.options:
-            for option in self.options:
-                if option.name == name:
-                    return option
-        return None
-
-    def get_option_value(
-        self,  # noqa: ANN101
-        name: str,
-        default: str | float | bool | None = None,
-    ) -> str | int | float | bool | None:
-        if self.options:
-            for option in self.options:
-                if option.name == name:
-                    return option.value
-        return default
+    filename: str
+    title: str | None = None
+    description: str | None = None
+    content_type: str | None = None
+    size: int
+    url: str
+    proxy_url: str
+    height: int | None = None
+    width: int | None = None
+    ephemeral: bool | None = None
+    duration_secs: float | None = None
+    waveform: str | None = None
+    flags: int | None = None
 
 
 class Emoji(BaseModel):
@@ -295,7 +283,53 @@ class ResolvedData(BaseModel):
     roles: dict[str, str] | None = None
     channels: dict[str, str] | None = None
     messages: dict[str, str] | None = None
-    attachments: dict[str, str] | None = None
+    attachments: dict[str, Attachment] | None = None
+
+
+class ApplicationCommandData(BaseModel):
+    """
+    Discord Interaction data from commands
+    https://discord.com/developers/docs/interactions/receiving-and-responding#interaction-object-interaction-data
+    """
+
+    id: str
+    name: str
+    type: int
+    resolved: ResolvedMessageObjectMap | ResolvedData | None = None
+    options: list[InteractionOption] | None = None
+    guild_id: str | None = None
+    target_id: str | None = None
+
+    def get_option(
+        self,  # noqa: ANN101
+        name: str,
+    ) -> InteractionOption | None:
+        if self.options:
+            for option in self.options:
+                if option.name == name:
+                    return option
+        return None
+
+    def get_option_value(
+        self,  # noqa: ANN101
+        name: str,
+        default: str | float | bool | None = None,
+    ) -> str | int | float | bool | None:
+        if self.options:
+            for option in self.options:
+                if option.name == name:
+                    return option.value
+        return default
+
+    def get_attachment(
+        self,
+        name: str,
+    ) -> Attachment | None:
+        attachment_id = self.get_option_value(name)
+        if attachment_id is None or not isinstance(self.resolved, ResolvedData):
+            return None
+
+        return (self.resolved.attachments or {}).get(str(attachment_id))
 
 
 class StringSelectMenuOptions(BaseModel):
@@ -382,6 +416,7 @@ class InteractionDefinitionOption(BaseModel):
 
 class InteractionDefinition(BaseModel):
     cmd_func: Callable
+    cache: ResponseCachePolicy | None = None
     context_types: list[InteractionContextType] | None = None
     default_member_permissions: str | None = None
     description: str
@@ -478,19 +513,29 @@ class EmbedField(BaseModel):
     inline: bool = True
 
 
+class EmbedMedia(BaseModel):
+    url: str
+    height: int | None = None
+    width: int | None = None
+
+
 class MessageEmbed(BaseModel):
     title: str | None = None
     description: str | None = None
     url: str | None = None
     color: int | None = None
     footer: str | None = None
-    image: str | None = None
-    thumbnail: str | None = None
+    image: EmbedMedia | None = None
+    thumbnail: EmbedMedia | None = None
     video: str | None = None
     author: str | None = None
     fields: list[EmbedField] | None = None
 
 
+# https://discord.com/developers/docs/resources/message#create-message-jsonform-params
+MESSAGE_CONTENT_LIMIT = 2000
+
+
 class InteractionMessage(BaseModel):
     content: str = ""
     embeds: list[MessageEmbed] | None = None
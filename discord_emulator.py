@@ -0,0 +1,535 @@
+"""
+A local stand-in for the parts of the Discord REST API this app uses, so command
+deploys and interaction follow-ups can be tested and benchmarked offline
+"""
+
+import asyncio
+import itertools
+import math
+import random
+import time
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+# Discord's epoch, snowflakes count milliseconds from here
+DISCORD_EPOCH_MS = 1420070400000
+# interaction callback types that create the original response message
+CHANNEL_MESSAGE_WITH_SOURCE = 4
+DEFERRED_CHANNEL_MESSAGE = 5
+# message flag shown as "thinking..." until a deferred response is edited
+LOADING_FLAG = 1 << 7
+
+
+class EmulatorSettings(BaseModel):
+    # requests allowed per bucket in each window
+    rate_limit: int = 5
+    rate_window: float = 1.0
+    # requests allowed across all buckets per second, 0 disables it
+    global_rate_limit: int = 50
+    latency_ms: float = 0
+    latency_jitter_ms: float = 0
+    # fraction of requests answered with a 500
+    error_rate: float = 0
+
+
+class RateLimitBucket:
+    def __init__(self, limit: int, window: float) -> None:
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset_at = time.time() + window
+
+    def take(self) -> bool:
+        now = time.time()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+
+        if self.remaining <= 0:
+            return False
+
+        self.remaining -= 1
+        return True
+
+    def headers(self, name: str) -> dict[str, str]:
+        reset_after = max(self.reset_at - time.time(), 0)
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": f"{self.reset_at:.3f}",
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": name,
+        }
+
+
+class EmulatorState:
+    """
+    Commands and interaction messages kept in memory, shaped like Discord's
+    """
+
+    def __init__(self, settings: EmulatorSettings) -> None:
+        self.settings = settings
+        self._sequence = itertools.count()
+        # (application id, guild id or None) -> command id -> command
+        self.commands: defaultdict[tuple[str, str | None], dict[str, dict]] = (
+            defaultdict(dict)
+        )
+        # (application id, interaction token) -> message id -> message
+        self.messages: defaultdict[tuple[str, str], dict[str, dict]] = defaultdict(
+            dict,
+        )
+        # interaction token -> message from the interaction's callback, the callback
+        # doesn't name the application so it's filed on the first webhook lookup
+        self.pending_originals: dict[str, dict] = {}
+        # (application id, interaction token) -> id of the original response
+        self.originals: dict[tuple[str, str], str] = {}
+        self.buckets: dict[str, RateLimitBucket] = {}
+        self.global_bucket = RateLimitBucket(settings.global_rate_limit, 1.0)
+
+    def snowflake(self) -> str:
+        timestamp = int(time.time() * 1000) - DISCORD_EPOCH_MS
+        return str((timestamp << 22) | (next(self._sequence) & 0xFFF))
+
+    def bucket(self, name: str) -> RateLimitBucket:
+        if name not in self.buckets:
+            self.buckets[name] = RateLimitBucket(
+                self.settings.rate_limit,
+                self.settings.rate_window,
+            )
+
+        return self.buckets[name]
+
+    def build_command(
+        self,
+        application_id: str,
+        guild_id: str | None,
+        command: dict,
+        command_id: str | None = None,
+    ) -> dict:
+        if not command.get("name"):
+            raise HTTPException(
+                status_code=400,
+                detail={"message": "Invalid Form Body", "code": 50035},
+            )
+
+        built = {
+            "type": 1,
+            "default_member_permissions": None,
+            "nsfw": False,
+            **command,
+            "id": command_id or self.snowflake(),
+            "application_id": application_id,
+            "version": self.snowflake(),
+        }
+        if guild_id:
+            built["guild_id"] = guild_id
+
+        return built
+
+    def build_message(self, application_id: str, message: dict) -> dict:
+        return {
+            "type": 20,
+            "content": "",
+            "embeds": [],
+            "components": [],
+            "attachments": [],
+            "tts": False,
+            "pinned": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "flags": 0,
+            **message,
+            "id": self.snowflake(),
+            "channel_id": "0",
+            "webhook_id": application_id,
+            "author": {
+                "id": application_id,
+                "username": "emulator",
+                "discriminator": "0000",
+                "bot": True,
+            },
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime()),
+        }
+
+
+class RateLimitedError(Exception):
+    def __init__(self, response: JSONResponse) -> None:
+        super().__init__("rate limited")
+        self.response = response
+
+
+def rate_limited(bucket: RateLimitBucket, is_global: bool) -> JSONResponse:  # noqa: FBT001
+    retry_after = max(bucket.reset_at - time.time(), 0.001)
+    headers = {
+        "Retry-After": str(math.ceil(retry_after)),
+        "X-RateLimit-Scope": "global" if is_global else "user",
+    }
+    if is_global:
+        headers["X-RateLimit-Global"] = "true"
+
+    return JSONResponse(
+        {
+            "message": "You are being rate limited.",
+            "retry_after": round(retry_after, 3),
+            "global": is_global,
+        },
+        status_code=429,
+        headers=headers,
+    )
+
+
+def bucket_name(request: Request) -> str:
+    """
+    Discord buckets routes on their template and major parameters, the guild for
+    guild commands and the webhook and token for interaction messages
+    """
+    route = request.scope.get("route")
+    template = route.path if route else request.url.path
+    major = ":".join(
+        request.path_params[name]
+        for name in ("application_id", "guild_id", "token")
+        if name in request.path_params
+    )
+    return f"{request.method}:{template}:{major}"
+
+
+def get_state(request: Request) -> EmulatorState:
+    return request.app.state.emulator
+
+
+State = Annotated[EmulatorState, Depends(get_state)]
+
+
+async def require_bot_token(authorization: Annotated[str, Header()] = "") -> None:
+    if not authorization.startswith("Bot "):
+        raise HTTPException(
+            status_code=401,
+            detail={"message": "401: Unauthorized", "code": 0},
+        )
+
+
+async def rate_limit(request: Request, state: State) -> None:
+    if state.settings.global_rate_limit and not state.global_bucket.take():
+        raise RateLimitedError(rate_limited(state.global_bucket, is_global=True))
+
+    name = bucket_name(request)
+    bucket = state.bucket(name)
+    if not bucket.take():
+        response = rate_limited(bucket, is_global=False)
+        response.headers.update(bucket.headers(name))
+        raise RateLimitedError(response)
+
+    request.state.rate_limit_headers = bucket.headers(name)
+
+
+def unknown_command() -> HTTPException:
+    return HTTPException(
+        status_code=404,
+        detail={"message": "Unknown application command", "code": 10063},
+    )
+
+
+# application and guild commands share handlers, guild_id is None for the former
+async def list_commands(
+    state: State,
+    application_id: str,
+    guild_id: str | None = None,
+) -> list[dict]:
+    return list(state.commands[(application_id, guild_id)].values())
+
+
+async def create_command(
+    state: State,
+    application_id: str,
+    command: dict,
+    guild_id: str | None = None,
+) -> JSONResponse:
+    commands = state.commands[(application_id, guild_id)]
+
+    # creating a command with an existing name overwrites it
+    for existing in commands.values():
+        if existing["name"] == command.get("name"):
+            updated = state.build_command(
+                application_id,
+                guild_id,
+                command,
+                existing["id"],
+            )
+            commands[existing["id"]] = updated
+            return JSONResponse(updated, status_code=200)
+
+    created = state.build_command(application_id, guild_id, command)
+    commands[created["id"]] = created
+    return JSONResponse(created, status_code=201)
+
+
+async def bulk_overwrite_commands(
+    state: State,
+    application_id: str,
+    commands: list[dict],
+    guild_id: str | None = None,
+) -> list[dict]:
+    existing = {
+        command["name"]: command["id"]
+        for command in state.commands[(application_id, guild_id)].values()
+    }
+
+    overwritten = {}
+    for command in commands:
+        built = state.build_command(
+            application_id,
+            guild_id,
+            command,
+            existing.get(command.get("name")),
+        )
+        overwritten[built["id"]] = built
+
+    state.commands[(application_id, guild_id)] = overwritten
+    return list(overwritten.values())
+
+
+async def get_command(
+    state: State,
+    application_id: str,
+    command_id: str,
+    guild_id: str | None = None,
+) -> dict:
+    command = state.commands[(application_id, guild_id)].get(command_id)
+    if command is None:
+        raise unknown_command()
+
+    return command
+
+
+async def edit_command(
+    state: State,
+    application_id: str,
+    command_id: str,
+    changes: dict,
+    guild_id: str | None = None,
+) -> dict:
+    command = await get_command(state, application_id, command_id, guild_id)
+    edited = state.build_command(
+        application_id,
+        guild_id,
+        {**command, **changes},
+        command_id,
+    )
+    state.commands[(application_id, guild_id)][command_id] = edited
+    return edited
+
+
+async def delete_command(
+    state: State,
+    application_id: str,
+    command_id: str,
+    guild_id: str | None = None,
+) -> Response:
+    if state.commands[(application_id, guild_id)].pop(command_id, None) is None:
+        raise unknown_command()
+
+    return Response(status_code=204)
+
+
+applications_router = APIRouter(
+    dependencies=[Depends(require_bot_token), Depends(rate_limit)],
+)
+
+for prefix in (
+    "/applications/{application_id}/commands",
+    "/applications/{application_id}/guilds/{guild_id}/commands",
+):
+    applications_router.add_api_route(prefix, list_commands, methods=["GET"])
+    applications_router.add_api_route(prefix, create_command, methods=["POST"])
+    applications_router.add_api_route(
+        prefix,
+        bulk_overwrite_commands,
+        methods=["PUT"],
+    )
+    applications_router.add_api_route(
+        f"{prefix}/{{command_id}}",
+        get_command,
+        methods=["GET"],
+    )
+    applications_router.add_api_route(
+        f"{prefix}/{{command_id}}",
+        edit_command,
+        methods=["PATCH"],
+    )
+    applications_router.add_api_route(
+        f"{prefix}/{{command_id}}",
+        delete_command,
+        methods=["DELETE"],
+    )
+
+
+webhooks_router = APIRouter(
+    prefix="/webhooks/{application_id}/{token}",
+    dependencies=[Depends(rate_limit)],
+)
+
+
+def find_message(
+    state: EmulatorState,
+    application_id: str,
+    token: str,
+    message_id: str,
+) -> dict:
+    key = (application_id, token)
+    messages = state.messages[key]
+
+    if message_id == "@original":
+        if token in state.pending_originals:
+            original = state.build_message(
+                application_id,
+                state.pending_originals.pop(token),
+            )
+            messages[original["id"]] = original
+            state.originals[key] = original["id"]
+
+        message_id = state.originals.get(key, "")
+
+    message = messages.get(message_id)
+    if message is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"message": "Unknown Message", "code": 10008},
+        )
+
+    return message
+
+
+@webhooks_router.post("")
+async def create_followup(
+    state: State,
+    application_id: str,
+    token: str,
+    message: dict,
+) -> dict:
+    built = state.build_message(application_id, message)
+    state.messages[(application_id, token)][built["id"]] = built
+    return built
+
+
+@webhooks_router.get("/messages/{message_id}")
+async def get_followup(
+    state: State,
+    application_id: str,
+    token: str,
+    message_id: str,
+) -> dict:
+    return find_message(state, application_id, token, message_id)
+
+
+@webhooks_router.patch("/messages/{message_id}")
+async def edit_followup(
+    state: State,
+    application_id: str,
+    token: str,
+    message_id: str,
+    changes: dict,
+) -> dict:
+    message = find_message(state, application_id, token, message_id)
+    # editing a deferred response replaces its "thinking" state
+    message["flags"] = message.get("flags", 0) & ~LOADING_FLAG
+    message.update(changes)
+    message["edited_timestamp"] = time.strftime(
+        "%Y-%m-%dT%H:%M:%S+00:00",
+        time.gmtime(),
+    )
+    return message
+
+
+@webhooks_router.delete("/messages/{message_id}", status_code=204)
+async def delete_followup(
+    state: State,
+    application_id: str,
+    token: str,
+    message_id: str,
+) -> Response:
+    message = find_message(state, application_id, token, message_id)
+    del state.messages[(application_id, token)][message["id"]]
+    return Response(status_code=204)
+
+
+interactions_router = APIRouter()
+
+
+@interactions_router.post("/interactions/{interaction_id}/{token}/callback")
+async def interaction_callback(
+    state: State,
+    interaction_id: str,
+    token: str,
+    callback: dict,
+) -> Response:
+    callback_type = callback.get("type")
+
+    if callback_type in {CHANNEL_MESSAGE_WITH_SOURCE, DEFERRED_CHANNEL_MESSAGE}:
+        message = {
+            **(callback.get("data") or {}),
+            "interaction_metadata": {"id": interaction_id},
+        }
+        if callback_type == DEFERRED_CHANNEL_MESSAGE:
+            message["flags"] = message.get("flags", 0) | LOADING_FLAG
+
+        state.pending_originals[token] = message
+
+    return Response(status_code=204)
+
+
+async def emulate_network(
+    request: Request,
+    call_next: Callable[[Request], Awaitable[Response]],
+) -> Response:
+    settings = request.app.state.emulator.settings
+
+    if settings.latency_ms or settings.latency_jitter_ms:
+        jitter = random.uniform(0, settings.latency_jitter_ms)  # noqa: S311
+        await asyncio.sleep((settings.latency_ms + jitter) / 1000)
+
+    if settings.error_rate and random.random() < settings.error_rate:  # noqa: S311
+        return JSONResponse(
+            {"message": "500: Internal Server Error", "code": 0},
+            status_code=500,
+        )
+
+    response = await call_next(request)
+
+    headers = getattr(request.state, "rate_limit_headers", None)
+    if headers:
+        response.headers.update(headers)
+
+    return response
+
+
+async def handle_rate_limit(_: Request, exc: RateLimitedError) -> Response:
+    return exc.response
+
+
+async def handle_http_error(_: Request, exc: HTTPException) -> JSONResponse:
+    # Discord errors are a bare {"message", "code"} object, not FastAPI's detail
+    body = exc.detail if isinstance(exc.detail, dict) else {"message": exc.detail}
+    return JSONResponse(body, status_code=exc.status_code)
+
+
+def build_app(settings: EmulatorSettings | None = None) -> FastAPI:
+    emulator = FastAPI(title="Discord REST emulator")
+    emulator.state.emulator = EmulatorState(settings or EmulatorSettings())
+
+    emulator.middleware("http")(emulate_network)
+    emulator.add_exception_handler(RateLimitedError, handle_rate_limit)
+    emulator.add_exception_handler(HTTPException, handle_http_error)
+
+    for router in (applications_router, webhooks_router, interactions_router):
+        emulator.include_router(router, prefix="/api/v10")
+
+    return emulator
+
+
+app = build_app()
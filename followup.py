@@ -0,0 +1,62 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+import httpx
+
+from config import application_id, discord_api_base_url
+from discord_api import DiscordInteraction, InteractionMessage
+from helpers import configure_logging
+
+logger = configure_logging(__name__)
+
+
+class FollowupSender:
+    """
+    Finishes deferred interactions. Work that can't fit in Discord's 3 second
+    response window runs in the background after a deferred response, and its
+    message replaces the original response once it's done.
+    """
+
+    def __init__(self, base_url: str, app_id: str) -> None:
+        self.app_id = app_id
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=10)
+        # keep references, the event loop only holds weak ones to running tasks
+        self._tasks: set[asyncio.Task] = set()
+
+    def defer(
+        self,
+        interaction: DiscordInteraction,
+        work: Callable[[], Awaitable[InteractionMessage]],
+    ) -> None:
+        task = asyncio.create_task(self._finish(interaction.token, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _finish(
+        self,
+        token: str,
+        work: Callable[[], Awaitable[InteractionMessage]],
+    ) -> None:
+        try:
+            message = await work()
+        except Exception as exc:
+            logger.exception("Deferred interaction failed", exc_info=exc)
+            message = InteractionMessage(content="Command was unable to complete.")
+
+        try:
+            response = await self.client.patch(
+                f"/webhooks/{self.app_id}/{token}/messages/@original",
+                json=message.to_json(),
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            logger.exception("Unable to send the deferred response", exc_info=exc)
+
+    async def close(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        await self.client.aclose()
+
+
+followups = FollowupSender(discord_api_base_url, application_id)
@@ -1,36 +1,135 @@
 from collections.abc import Callable
 
+import httpx
 from pydantic import BaseModel
 
+from attachments import (
+    AttachmentTooLargeError,
+    UnsupportedAttachmentError,
+    blob_store,
+    download_client,
+)
 from discord_api import (
     ApplicationCommandData,
     ApplicationCommandOptionType,
+    Attachment,
+    ButtonComponent,
+    ButtonStyle,
+    ComponentActionRow,
     DiscordInteraction,
     InteractionDefinition,
     InteractionDefinitionOption,
     InteractionIntegrationType,
     InteractionMessage,
 )
+from followup import followups
+from helpers import configure_logging
+from response_cache import ResponseCache
+from store import HiddenPost, hidden_posts
+
+logger = configure_logging(__name__)
 
 
 class InteractionResult(BaseModel):
     message: InteractionMessage | None = None
     success: bool
     reason: str
+    # the message follows later through followups, answer with a deferred response
+    deferred: bool = False
 
 
 # Interaction Definitions - The commands our app will run
+def hidden_post_message(post: HiddenPost) -> InteractionMessage:
+    return InteractionMessage(
+        content="psst, someone left a hidden message",
+        flags=0,
+        components=[
+            ComponentActionRow(
+                components=[
+                    ButtonComponent(
+                        style=ButtonStyle.SECONDARY,
+                        label="Reveal",
+                        custom_id=f"reveal:{post.id}",
+                    ),
+                ],
+            ),
+        ],
+    )
+
+
+async def post_with_image(
+    content: str,
+    author_id: str | None,
+    image: Attachment,
+) -> InteractionMessage:
+    """
+    Store the image and then the post, run after a deferred response since
+    downloading the image can take longer than Discord waits for an answer
+    """
+    try:
+        blob = await blob_store.ingest(download_client, image)
+    except (AttachmentTooLargeError, UnsupportedAttachmentError) as exc:
+        reason = str(exc)
+    except httpx.HTTPError as exc:
+        logger.exception("Unable to download attachment", exc_info=exc)
+        reason = "Unable to download the attachment"
+    else:
+        reason = None
+
+    if reason:
+        return InteractionMessage(content=f"Error while running the command: {reason}")
+
+    await hidden_posts.add_blob(blob)
+    post = await hidden_posts.create_post(
+        content=content,
+        author_id=author_id,
+        attachments=[blob.digest],
+    )
+    return hidden_post_message(post)
+
+
 async def hidden_message_fn(interaction: DiscordInteraction) -> InteractionResult:
     """
     A function for hidden messages
     """
-    if interaction.data and isinstance(interaction.data, ApplicationCommandData):
-        user_id = None
-        if interaction.user:
-            user_id = interaction.user["id"]
-
-    print("Command from: ", user_id)
-    return InteractionResult(success=True, reason="This is a test message")
+    if not interaction.data or not isinstance(
+        interaction.data,
+        ApplicationCommandData,
+    ):
+        return InteractionResult(success=False, reason="Missing command data")
+
+    user_id = None
+    if interaction.user:
+        user_id = interaction.user["id"]
+
+    logger.debug("Command from: %s", user_id)
+
+    content = str(interaction.data.get_option_value("message", ""))
+    image = interaction.data.get_attachment("image")
+    if image:
+        # refuse what we can straight away, before deferring
+        try:
+            blob_store.check(image)
+        except (AttachmentTooLargeError, UnsupportedAttachmentError) as exc:
+            return InteractionResult(success=False, reason=str(exc))
+
+        followups.defer(
+            interaction,
+            lambda: post_with_image(content, user_id, image),
+        )
+        return InteractionResult(
+            success=True,
+            reason="Storing the attachment",
+            deferred=True,
+        )
+
+    post = await hidden_posts.create_post(content=content, author_id=user_id)
+
+    return InteractionResult(
+        success=True,
+        reason="Hidden message posted",
+        message=hidden_post_message(post),
+    )
 
 
 hidden_message = InteractionDefinition(
@@ -47,13 +146,19 @@ hidden_message = InteractionDefinition(
             description="the message",
             required=True,
         ),
+        InteractionDefinitionOption(
+            name="image",
+            type=ApplicationCommandOptionType.ATTACHMENT,
+            description="an image to hide with the message",
+            required=False,
+        ),
     ],
 )
 
 
 # Helper Functions and classes
 def get_json_model(command: InteractionDefinition) -> dict:
-    return command.model_dump(exclude_none=True, exclude={"cmd_func"})
+    return command.model_dump(exclude_none=True, exclude={"cmd_func", "cache"})
 
 
 def get_command_locations() -> tuple[dict, list]:
@@ -88,6 +193,19 @@ def build_command_routers() -> dict[str, Callable]:
     return command_router
 
 
+def build_command_caches() -> dict[str, ResponseCache]:
+    """
+    Response caches for the commands that opted in with a cache policy
+    """
+    command_caches = {}
+
+    for command in all_commands:
+        if command.cache:
+            command_caches[command.name] = ResponseCache(command.name, command.cache)
+
+    return command_caches
+
+
 async def get_command_result(command_router, interaction) -> InteractionResult:
     return await command_router[interaction.data.name](
         interaction,
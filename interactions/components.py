@@ -2,10 +2,19 @@ from collections.abc import Callable
 
 from pydantic import BaseModel
 
+from config import public_url
 from discord_api import (
+    ButtonComponent,
+    ButtonStyle,
+    ComponentActionRow,
+    DiscordInteraction,
+    EmbedMedia,
     InteractionMessage,
+    MessageEmbed,
 )
 from helpers import configure_logging
+from single_flight import SingleFlight
+from store import HiddenPostPage, hidden_posts
 
 logger = configure_logging(__name__)
 
@@ -13,6 +22,10 @@ logger = configure_logging(__name__)
 class ComponentCommand(BaseModel):
     name: str
     cmd_func: Callable
+    # share one computation between concurrent clicks on the same custom_id,
+    # only for components whose result doesn't depend on who clicked
+    single_flight: bool = False
+    hot_cache_ttl: float = 2.0
 
 
 class ComponentResultData(BaseModel):
@@ -27,14 +40,95 @@ class ComponentResult(BaseModel):
         return self.model_dump(exclude_none=True)
 
 
-async def get_component_result(component_router, interaction) -> ComponentResult:
+async def get_component_result(
+    component_router,
+    interaction,
+    component_flights: dict[str, SingleFlight] | None = None,
+) -> ComponentResult:
     interaction_name = interaction.data.custom_id.split(":")[0]
-    return await component_router[interaction_name](
+    cmd_func = component_router[interaction_name]
+
+    flight = (component_flights or {}).get(interaction_name)
+    if flight:
+        return await flight.do(
+            interaction.data.custom_id,
+            lambda: cmd_func(interaction),
+        )
+
+    return await cmd_func(
         interaction,
     )
 
 
-all_components = []
+def page_buttons(page: HiddenPostPage) -> list[ComponentActionRow]:
+    """
+    Previous and next buttons for a paged post, the page to show is carried in the
+    custom_id so a click goes straight to it
+    """
+    if page.count == 1:
+        return []
+
+    last = page.count - 1
+    return [
+        ComponentActionRow(
+            components=[
+                ButtonComponent(
+                    style=ButtonStyle.SECONDARY,
+                    label="Previous",
+                    custom_id=f"reveal:{page.post_id}:{max(page.index - 1, 0)}",
+                    disabled=page.index == 0,
+                ),
+                ButtonComponent(
+                    style=ButtonStyle.SECONDARY,
+                    label=f"{page.index + 1}/{page.count}",
+                    custom_id=f"reveal:{page.post_id}:{page.index}:position",
+                    disabled=True,
+                ),
+                ButtonComponent(
+                    style=ButtonStyle.SECONDARY,
+                    label="Next",
+                    custom_id=f"reveal:{page.post_id}:{min(page.index + 1, last)}",
+                    disabled=page.index == last,
+                ),
+            ],
+        ),
+    ]
+
+
+async def reveal_fn(interaction: DiscordInteraction) -> ComponentResult:
+    """
+    Show a hidden post to whoever clicked its reveal button. The reveal button opens
+    the first page in a new message, the page buttons then edit that message.
+    """
+    _, post_id, *index = interaction.data.custom_id.split(":")
+    paging = bool(index)
+    page = await hidden_posts.get_page(post_id, int(index[0]) if paging else 0)
+
+    if page is None:
+        return ComponentResult(
+            type=4,
+            data=InteractionMessage(content="This hidden message is gone."),
+        )
+
+    embeds = [
+        MessageEmbed(image=EmbedMedia(url=f"{public_url}/blobs/{digest}"))
+        for digest in page.attachments
+    ]
+
+    return ComponentResult(
+        # UPDATE_MESSAGE when turning a page, CHANNEL_MESSAGE_WITH_SOURCE otherwise
+        type=7 if paging else 4,
+        data=InteractionMessage(
+            content=page.content,
+            embeds=embeds or None,
+            components=page_buttons(page),
+        ),
+    )
+
+
+reveal = ComponentCommand(name="reveal", cmd_func=reveal_fn, single_flight=True)
+
+all_components = [reveal]
 
 
 def build_component_router() -> dict[str, Callable]:
@@ -44,3 +138,16 @@ def build_component_router() -> dict[str, Callable]:
         component_router[component.name] = component.cmd_func
 
     return component_router
+
+
+def build_component_flights() -> dict[str, SingleFlight]:
+    component_flights = {}
+
+    for component in all_components:
+        if component.single_flight:
+            component_flights[component.name] = SingleFlight(
+                component.name,
+                ttl=component.hot_cache_ttl,
+            )
+
+    return component_flights
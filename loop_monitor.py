@@ -0,0 +1,179 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections.abc import Coroutine, Iterator
+from contextlib import contextmanager, suppress
+
+from helpers import configure_logging
+from metrics import metrics
+
+logger = configure_logging(__name__)
+
+# every tracker, so a task started on behalf of an interaction can inherit it
+_trackers: weakref.WeakSet["InteractionTracker"] = weakref.WeakSet()
+
+
+class InteractionTracker:
+    """
+    Remembers which interaction each asyncio task is handling, so code outside of
+    the event loop thread can tell what was running on the loop at a given moment
+    """
+
+    def __init__(self) -> None:
+        self._tasks: weakref.WeakKeyDictionary[asyncio.Task, str] = (
+            weakref.WeakKeyDictionary()
+        )
+        _trackers.add(self)
+
+    @contextmanager
+    def track(self, name: str) -> Iterator[None]:
+        task = asyncio.current_task()
+        if task is None:
+            yield
+            return
+
+        previous = self._tasks.get(task)
+        self._tasks[task] = name
+
+        try:
+            yield
+        finally:
+            if previous is None:
+                self._tasks.pop(task, None)
+            else:
+                self._tasks[task] = previous
+
+    def running(self, loop: asyncio.AbstractEventLoop) -> str | None:
+        """
+        The interaction being handled by the task currently running on `loop`
+        """
+        task = asyncio.current_task(loop)
+        if task is None:
+            return None
+
+        return self._tasks.get(task)
+
+    def inherit(self, task: asyncio.Task, parent: asyncio.Task) -> None:
+        name = self._tasks.get(parent)
+        if name is not None:
+            self._tasks[task] = name
+
+
+def create_tracked_task(coro: Coroutine) -> asyncio.Task:
+    """
+    Run `coro` in a new task that counts as handling the same interaction as the
+    current task in every tracker, for work shared between callers
+    """
+    parent = asyncio.current_task()
+    task = asyncio.ensure_future(coro)
+
+    if parent is not None:
+        for tracker in _trackers:
+            tracker.inherit(task, parent)
+
+    return task
+
+
+interaction_tracker = InteractionTracker()
+
+
+class LoopWatchdog:
+    """
+    Detects event loop stalls. A heartbeat coroutine measures how late the loop
+    wakes it up, while a monitor thread notices when the heartbeat stops and
+    samples the loop thread's stack to find the blocking code.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        tracker: InteractionTracker = interaction_tracker,
+        stack_limit: int = 30,
+    ) -> None:
+        self.threshold = threshold
+        self.interval = threshold / 4
+        self.tracker = tracker
+        self.stack_limit = stack_limit
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._heartbeat: asyncio.Task | None = None
+        self._monitor: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._last_beat = time.monotonic()
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+
+        self._heartbeat = self._loop.create_task(self._beat())
+        self._monitor = threading.Thread(
+            target=self._watch,
+            name="loop-watchdog",
+            daemon=True,
+        )
+        self._monitor.start()
+        logger.info("Event loop watchdog started, threshold %.3fs", self.threshold)
+
+    async def stop(self) -> None:
+        self._stopped.set()
+
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._heartbeat
+
+        if self._monitor:
+            await asyncio.to_thread(self._monitor.join)
+
+        self._heartbeat = None
+        self._monitor = None
+
+    async def _beat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+
+            lag = max(now - expected, 0)
+            metrics.set("event_loop_lag_seconds", lag)
+            if lag >= self.threshold:
+                metrics.observe("event_loop_stall_seconds", lag)
+
+    def _watch(self) -> None:
+        reported_beat = None
+
+        while not self._stopped.wait(self.interval):
+            last_beat = self._last_beat
+            stalled_for = time.monotonic() - last_beat
+
+            # report each stall once, the heartbeat moves on when the loop recovers
+            if stalled_for < self.threshold or reported_beat == last_beat:
+                continue
+
+            reported_beat = last_beat
+            self._report(stalled_for)
+
+    def _report(self, stalled_for: float) -> None:
+        interaction = None
+        if self._loop:
+            interaction = self.tracker.running(self._loop)
+
+        stack = ""
+        frame = sys._current_frames().get(self._loop_thread_id)  # noqa: SLF001
+        if frame:
+            stack = "".join(traceback.format_stack(frame, limit=self.stack_limit))
+
+        metrics.inc("event_loop_stalls_total", interaction=interaction or "unknown")
+        logger.warning(
+            "Event loop stalled for %.3fs while handling %s:\n%s",
+            stalled_for,
+            interaction or "no interaction",
+            stack,
+        )
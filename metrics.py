@@ -0,0 +1,95 @@
+import threading
+from collections import defaultdict
+
+LabelSet = tuple[tuple[str, str], ...]
+
+
+def _label_set(labels: dict[str, object]) -> LabelSet:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: LabelSet) -> str:
+    if not labels:
+        return ""
+
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels)
+    return f"{{{pairs}}}"
+
+
+class Metrics:
+    """
+    A small in-process metrics registry. Counters, gauges and summaries are
+    keyed on a metric name plus a set of labels and can be updated from any
+    thread.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[LabelSet, float]] = defaultdict(dict)
+        self._gauges: dict[str, dict[LabelSet, float]] = defaultdict(dict)
+        # summaries are stored as [count, sum, max]
+        self._summaries: dict[str, dict[LabelSet, list[float]]] = defaultdict(dict)
+
+    def inc(self, name: str, value: float = 1, **labels: object) -> None:
+        key = _label_set(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: object) -> None:
+        key = _label_set(labels)
+        with self._lock:
+            self._gauges[name][key] = value
+
+    def observe(self, name: str, value: float, **labels: object) -> None:
+        key = _label_set(labels)
+        with self._lock:
+            series = self._summaries[name]
+            summary = series.get(key)
+            if summary is None:
+                series[key] = [1, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = max(summary[2], value)
+
+    def get(self, name: str, **labels: object) -> float:
+        key = _label_set(labels)
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name].get(key, 0)
+            return self._gauges.get(name, {}).get(key, 0)
+
+    def render(self) -> str:
+        """
+        Render every series in the Prometheus text exposition format
+        """
+        lines = []
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(
+                    f"{name}{_format_labels(labels)} {value}"
+                    for labels, value in series.items()
+                )
+
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(
+                    f"{name}{_format_labels(labels)} {value}"
+                    for labels, value in series.items()
+                )
+
+            for name, series in sorted(self._summaries.items()):
+                lines.append(f"# TYPE {name} summary")
+                for labels, (count, total, maximum) in series.items():
+                    label_text = _format_labels(labels)
+                    lines.append(f"{name}_count{label_text} {count}")
+                    lines.append(f"{name}_sum{label_text} {total}")
+                    lines.append(f"{name}_max{label_text} {maximum}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
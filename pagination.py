@@ -0,0 +1,176 @@
+"""
+Splits long text into pages that fit in a Discord message, breaking on paragraphs,
+then lines, then words. Code fences and inline spans like spoilers and bold that are
+open at a page break are closed on that page and reopened on the next.
+"""
+
+import re
+
+from discord_api import MESSAGE_CONTENT_LIMIT
+
+FENCE_PATTERN = re.compile(r"^\s*(`{3,}|~{3,})(.*)$")
+# longest fence line carried over to the next page, longer info strings are dropped
+MAX_REOPEN_LENGTH = 32
+# don't break so early that a page ends up mostly empty
+MIN_PAGE_FILL = 0.5
+# inline markdown that has to be balanced on every page, longest first so "**"
+# isn't read as two "*"
+SPAN_MARKERS = ("||", "**", "__", "~~", "*")
+
+
+def fence_marker(fence: str) -> str:
+    return FENCE_PATTERN.match(fence).group(1)
+
+
+def closes_fence(line: str, opening: str) -> bool:
+    match = FENCE_PATTERN.match(line)
+    opening_marker = fence_marker(opening)
+
+    return bool(
+        match
+        and match.group(1)[0] == opening_marker[0]
+        and len(match.group(1)) >= len(opening_marker)
+        and not match.group(2).strip(),
+    )
+
+
+def open_fence(text: str) -> str | None:
+    """
+    The opening line of the code block still open at the end of `text`
+    """
+    fence = None
+
+    for line in text.split("\n"):
+        if fence is None:
+            if FENCE_PATTERN.match(line):
+                fence = line.strip()
+        elif closes_fence(line, fence):
+            fence = None
+
+    return fence
+
+
+def match_span(line: str, index: int) -> str | None:
+    for marker in SPAN_MARKERS:
+        if line.startswith(marker, index):
+            return marker
+
+    return None
+
+
+def scan_spans(line: str, spans: list[str]) -> None:
+    """
+    Update the stack of spans open before `line` with the markers in it, skipping
+    escapes and inline code
+    """
+    index = 0
+
+    while index < len(line):
+        char = line[index]
+        if char == "\\":
+            index += 2
+            continue
+
+        if char == "`":
+            end = line.find("`", index + 1)
+            index = end + 1 if end != -1 else index + 1
+            continue
+
+        marker = match_span(line, index)
+        if marker is None:
+            index += 1
+            continue
+
+        after = index + len(marker)
+        # like markdown, a closer can't follow whitespace and an opener can't
+        # be followed by it, so "* item" and "2 * 3" are left alone
+        if marker in spans and index and not line[index - 1].isspace():
+            del spans[len(spans) - 1 - spans[::-1].index(marker)]
+        elif after < len(line) and not line[after].isspace():
+            spans.append(marker)
+
+        index = after
+
+
+def open_spans(text: str) -> list[str]:
+    """
+    The inline spans still open at the end of `text`, outermost first. Code blocks
+    are skipped, markdown inside them is shown as is.
+    """
+    spans: list[str] = []
+    fence = None
+
+    for line in text.split("\n"):
+        if fence is None and FENCE_PATTERN.match(line):
+            fence = line.strip()
+        elif fence is not None:
+            if closes_fence(line, fence):
+                fence = None
+        else:
+            scan_spans(line, spans)
+
+    return spans
+
+
+def break_point(text: str, budget: int) -> tuple[int, int]:
+    """
+    Where a page of at most `budget` characters from the start of `text` should
+    end, and where the next page picks up
+    """
+    window = text[: budget + 1]
+    earliest = int(budget * MIN_PAGE_FILL)
+
+    for separator in ("\n\n", "\n", " "):
+        index = window.rfind(separator)
+        if index > earliest:
+            return index, index + len(separator)
+
+    return budget, budget
+
+
+def take_page(
+    text: str,
+    reopen: str,
+    limit: int,
+) -> tuple[str, str, str | None, list[str]]:
+    """
+    Cut one page off the front of `text`, returning the page, the remaining text and
+    the code fence or inline spans left open at the break
+    """
+    budget = limit - len(reopen)
+
+    while True:
+        end, resume = break_point(text, budget)
+        page = reopen + text[:end].rstrip()
+
+        # inside a code block markdown isn't rendered, only the fence needs closing
+        fence = open_fence(page)
+        spans = [] if fence else open_spans(page)
+        closing = "\n" + fence_marker(fence) if fence else "".join(reversed(spans))
+
+        if len(page) + len(closing) <= limit:
+            return page + closing, text[resume:].lstrip("\n"), fence, spans
+
+        # make room for the closing markers and try again
+        budget = max(budget - len(closing), 1)
+
+
+def paginate(text: str, limit: int = MESSAGE_CONTENT_LIMIT) -> list[str]:
+    pages = []
+    reopen = ""
+
+    while len(reopen) + len(text) > limit:
+        page, text, fence, spans = take_page(text, reopen, limit)
+        pages.append(page)
+
+        reopen = ""
+        if fence:
+            reopen = fence if len(fence) <= MAX_REOPEN_LENGTH else fence_marker(fence)
+            reopen += "\n"
+        elif spans:
+            reopen = "".join(spans)
+            # an opener followed by a space wouldn't open anything
+            text = text.lstrip(" ")
+
+    pages.append(reopen + text)
+    return pages
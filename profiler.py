@@ -0,0 +1,131 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from types import FrameType
+
+from pydantic import BaseModel, Field
+
+from helpers import configure_logging
+from loop_monitor import InteractionTracker
+
+logger = configure_logging(__name__)
+
+
+class ProfilerSettings(BaseModel):
+    # fraction of all interactions to profile
+    sample_rate: float = Field(default=0, ge=0, le=1)
+    # always profile this command or component
+    command: str | None = None
+
+
+def collapse_stack(frame: FrameType) -> str:
+    """
+    Render a stack in the collapsed format used by flamegraph tools, outermost
+    frame first and separated by semicolons
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{Path(code.co_filename).stem}:{code.co_qualname}")
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Samples the event loop thread's stack while a profiled interaction is running
+    on it, aggregating collapsed stacks per command. The sampler thread only runs
+    while there are profiled interactions in flight, so a disabled profiler costs
+    a couple of attribute checks per request.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        settings: ProfilerSettings | None = None,
+        interval: float = 0.005,
+    ) -> None:
+        self.directory = Path(directory)
+        self.settings = settings or ProfilerSettings()
+        self.interval = interval
+
+        self._profiled = InteractionTracker()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._sampler: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._stacks: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+    def should_profile(self, name: str) -> bool:
+        settings = self.settings
+        if not settings.sample_rate and not settings.command:
+            return False
+
+        return name == settings.command or random.random() < settings.sample_rate  # noqa: S311
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[None]:
+        with self._lock:
+            self._active += 1
+            if self._sampler is None:
+                self._loop = asyncio.get_running_loop()
+                self._loop_thread_id = threading.get_ident()
+                self._sampler = threading.Thread(
+                    target=self._sample,
+                    name="sampling-profiler",
+                    daemon=True,
+                )
+                self._sampler.start()
+
+        try:
+            with self._profiled.track(name):
+                yield
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _sample(self) -> None:
+        samples: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    break
+
+            name = self._profiled.running(self._loop)
+            frame = sys._current_frames().get(self._loop_thread_id)  # noqa: SLF001
+            if name and frame:
+                samples[name][collapse_stack(frame)] += 1
+
+            time.sleep(self.interval)
+
+        if samples:
+            self.flush(samples)
+
+    def flush(self, samples: dict[str, Counter[str]]) -> None:
+        """
+        Merge a sampler run into the totals and rewrite the collapsed stack file
+        of each command it saw
+        """
+        with self._flush_lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+            for name, stacks in samples.items():
+                totals = self._stacks[name]
+                totals.update(stacks)
+
+                lines = [f"{stack} {count}\n" for stack, count in totals.items()]
+                file_name = name.replace("/", "_")
+                (self.directory / f"{file_name}.collapsed").write_text("".join(lines))
+
+        logger.debug("Wrote profiles for %s", ", ".join(samples))
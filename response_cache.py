@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import TYPE_CHECKING
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from metrics import metrics
+
+if TYPE_CHECKING:
+    from discord_api import DiscordInteraction
+
+CacheKey = tuple
+
+
+class CacheScope(Enum):
+    GLOBAL = "global"
+    GUILD = "guild"
+    USER = "user"
+
+
+class ResponseCachePolicy(BaseModel):
+    """
+    Opt-in response caching for a command whose response only depends on its
+    options, the caller's locale and optionally the guild or user it's run by
+    """
+
+    ttl: float = 60
+    max_entries: int = 256
+    scope: CacheScope = CacheScope.GLOBAL
+
+
+def _normalize_options(options: list | None, path: list[str]) -> tuple:
+    """
+    Walk the option tree, subcommands and groups extend the command path while
+    the leaf options are returned sorted by name
+    """
+    values = []
+
+    for option in options or []:
+        if option.value is None and isinstance(option.options, list):
+            path.append(option.name)
+            values.extend(_normalize_options(option.options, path))
+        else:
+            values.append((option.name, option.value))
+
+    return tuple(sorted(values, key=lambda item: item[0]))
+
+
+class ResponseCache:
+    """
+    A TTL and LRU bounded cache of serialized interaction responses for a single
+    command, cache hits skip both the command handler and serialization
+    """
+
+    def __init__(self, name: str, policy: ResponseCachePolicy) -> None:
+        self.name = name
+        self.policy = policy
+        self._entries: OrderedDict[CacheKey, tuple[float, bytes]] = OrderedDict()
+
+    def key(self, interaction: "DiscordInteraction") -> CacheKey:
+        path = [interaction.data.name]
+        options = _normalize_options(interaction.data.options, path)
+
+        scope = None
+        if self.policy.scope == CacheScope.GUILD:
+            scope = interaction.guild_id
+        elif self.policy.scope == CacheScope.USER:
+            user = interaction.user or (interaction.member or {}).get("user") or {}
+            scope = user.get("id")
+
+        return (tuple(path), options, interaction.locale, scope)
+
+    def get(self, key: CacheKey) -> bytes | None:
+        entry = self._entries.get(key)
+
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            metrics.inc("response_cache_misses_total", command=self.name)
+            return None
+
+        self._entries.move_to_end(key)
+        metrics.inc("response_cache_hits_total", command=self.name)
+        return entry[1]
+
+    def store(self, key: CacheKey, content: dict) -> Response:
+        """
+        Serialize `content` once, keeping the bytes for later hits
+        """
+        response = JSONResponse(content)
+
+        self._entries[key] = (time.monotonic() + self.policy.ttl, response.body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.policy.max_entries:
+            self._entries.popitem(last=False)
+
+        return response
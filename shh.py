@@ -1,76 +1,342 @@
 #!/usr/bin/env python3
 
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import APIRouter, Depends, FastAPI
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 
-from config import discord_public_key
-from depends import ValidateDiscordRequest
+from admission import BUSY_RESPONSE, AdmissionController, ReceivedAtMiddleware
+from analytics import UsageCall, UsageRecorder
+from attachments import (
+    ALLOWED_CONTENT_TYPES,
+    blob_store,
+    download_client,
+    normalize_content_type,
+)
+from capture import TrafficCapture
+from config import (
+    admin_token,
+    admission_max_inflight,
+    capture_dir,
+    capture_enabled,
+    capture_max_file_bytes,
+    capture_max_files,
+    capture_sample_rate,
+    compaction_pages,
+    compaction_window,
+    discord_public_key,
+    interaction_deadline_ms,
+    loop_stall_threshold_ms,
+    loop_watchdog_enabled,
+    profile_command,
+    profile_dir,
+    profile_interval_ms,
+    profile_sample_rate,
+    sweep_batch_size,
+    sweep_interval_seconds,
+    sweep_time_budget_ms,
+    usage_flush_seconds,
+)
+from depends import ValidateAdminRequest, ValidateDiscordRequest
 from discord_api import DiscordInteraction, InteractionTypes, MessageComponentData
+from followup import followups
 from helpers import configure_logging
-from interactions.commands import build_command_routers, get_command_result
-from interactions.components import build_component_router, get_component_result
+from interactions.commands import (
+    build_command_caches,
+    build_command_routers,
+    get_command_result,
+)
+from interactions.components import (
+    build_component_flights,
+    build_component_router,
+    get_component_result,
+)
+from loop_monitor import LoopWatchdog, interaction_tracker
+from metrics import metrics
+from profiler import ProfilerSettings, SamplingProfiler
+from store import hidden_posts
+from sweeper import Sweeper, parse_window
 
+traffic_capture = None
+if capture_enabled:
+    traffic_capture = TrafficCapture(
+        capture_dir,
+        sample_rate=capture_sample_rate,
+        max_file_bytes=capture_max_file_bytes,
+        max_files=capture_max_files,
+    )
+
+validate_discord_request = ValidateDiscordRequest(
+    discord_public_key,
+    capture=traffic_capture,
+)
 discord_router = APIRouter(
     prefix="/discord",
-    dependencies=[Depends(ValidateDiscordRequest(discord_public_key))],
+    dependencies=[Depends(validate_discord_request)],
+)
+admin_router = APIRouter(
+    prefix="/admin",
+    dependencies=[Depends(ValidateAdminRequest(admin_token))],
 )
 
 logger = configure_logging(__name__)
 command_router = build_command_routers()
+command_caches = build_command_caches()
 component_router = build_component_router()
+component_flights = build_component_flights()
+admission = AdmissionController(
+    admission_max_inflight,
+    deadline=interaction_deadline_ms / 1000,
+)
+profiler = SamplingProfiler(
+    profile_dir,
+    ProfilerSettings(sample_rate=profile_sample_rate, command=profile_command),
+    interval=profile_interval_ms / 1000,
+)
+sweeper = Sweeper(
+    hidden_posts,
+    blob_store,
+    interval=sweep_interval_seconds,
+    batch_size=sweep_batch_size,
+    time_budget=sweep_time_budget_ms / 1000,
+    compaction_window=parse_window(compaction_window),
+    compaction_pages=compaction_pages,
+)
+usage = UsageRecorder(hidden_posts, interval=usage_flush_seconds)
 
 
-@discord_router.post("/interactions")
-async def discord_interactions(
-    interaction: DiscordInteraction,
-) -> dict:
-    """ref: https://discord.com/developers/docs/interactions/receiving-and-responding#responding-to-an-interaction"""
-    if interaction.type == InteractionTypes.PING:
-        return {"type": 1}
+def interaction_name(interaction: DiscordInteraction) -> str | None:
+    """
+    The command or component an interaction is for
+    """
+    if isinstance(interaction.data, MessageComponentData):
+        return interaction.data.custom_id.split(":")[0]
 
-    if interaction.type == InteractionTypes.APPLICATION_COMMAND:
-        if interaction.data:
-            try:
-                result = await get_command_result(command_router, interaction)
-            except KeyError as exc:
-                logger.exception("No key for command", exc_info=exc)
-                return {
-                    "type": 4,
-                    "data": {"content": "Command was unable to complete.", "flags": 64},
-                }
+    if interaction.data:
+        return interaction.data.name
 
-            if result and result.success:
-                if result.message:
-                    return {"type": 4, "data": result.message.to_json()}
+    return None
 
-                return {"type": 4, "data": {"content": result.reason, "flags": 68}}
 
+def usage_name(interaction: DiscordInteraction) -> str | None:
+    """
+    The name usage is recorded under, page turns on a revealed post count apart
+    from the reveal itself
+    """
+    name = interaction_name(interaction)
+    if (
+        isinstance(interaction.data, MessageComponentData)
+        and interaction.data.custom_id.count(":") > 1
+    ):
+        return f"{name}_page"
+
+    return name
+
+
+async def run_command(
+    interaction: DiscordInteraction,
+    call: UsageCall,
+) -> dict | Response:
+    cache = command_caches.get(interaction.data.name)
+    if cache:
+        cache_key = cache.key(interaction)
+        if cached := cache.get(cache_key):
+            return Response(content=cached, media_type="application/json")
+
+    try:
+        with interaction_tracker.track(interaction.data.name):
+            result = await get_command_result(command_router, interaction)
+    except KeyError as exc:
+        logger.exception("No key for command", exc_info=exc)
+        call.error = True
         return {
             "type": 4,
-            "data": {
-                "content": f"Error while running the command: {result.reason}",
-                "flags": 64,
-            },
+            "data": {"content": "Command was unable to complete.", "flags": 64},
         }
 
+    if result and result.success:
+        if result.deferred:
+            return {"type": 5}
+
+        if result.message:
+            response = {"type": 4, "data": result.message.to_json()}
+        else:
+            response = {"type": 4, "data": {"content": result.reason, "flags": 68}}
+
+        if cache:
+            return cache.store(cache_key, response)
+
+        return response
+
+    call.error = True
+    return {
+        "type": 4,
+        "data": {
+            "content": f"Error while running the command: {result.reason}",
+            "flags": 64,
+        },
+    }
+
+
+async def run_component(interaction: DiscordInteraction, call: UsageCall) -> dict:
+    try:
+        with interaction_tracker.track(interaction_name(interaction)):
+            result = await get_component_result(
+                component_router,
+                interaction,
+                component_flights,
+            )
+    except KeyError as exc:
+        logger.exception("No key for command", exc_info=exc)
+        call.error = True
+        return {}
+
+    if result:
+        return result.to_json()
+
+    call.error = True
+    return {}
+
+
+async def dispatch_interaction(interaction: DiscordInteraction) -> dict | Response:
+    if interaction.type == InteractionTypes.APPLICATION_COMMAND and interaction.data:
+        with usage.track(interaction.data.name, interaction.guild_id) as call:
+            return await run_command(interaction, call)
+
     if (
         interaction.type == InteractionTypes.MESSAGE_COMPONENT
         and interaction.data
         and isinstance(interaction.data, MessageComponentData)
     ):
-        try:
-            result = await get_component_result(component_router, interaction)
-        except KeyError as exc:
-            logger.exception("No key for command", exc_info=exc)
-
-        if result:
-            return result.to_json()
+        with usage.track(usage_name(interaction), interaction.guild_id) as call:
+            return await run_component(interaction, call)
 
     return {}
 
 
-app = FastAPI()
+@discord_router.post("/interactions", response_model=None)
+async def discord_interactions(
+    interaction: DiscordInteraction,
+    request: Request,
+) -> dict | Response:
+    """ref: https://discord.com/developers/docs/interactions/receiving-and-responding#responding-to-an-interaction"""
+    # stamped by ReceivedAtMiddleware before the body was read and verified
+    received_at = getattr(request.state, "received_at", None)
+
+    # PINGs are how Discord checks we're alive, never shed them
+    if interaction.type == InteractionTypes.PING:
+        return {"type": 1}
+
+    async with admission.slot(received_at) as admitted:
+        if not admitted:
+            # shed requests never reach dispatch, count them as failed calls here
+            if name := usage_name(interaction):
+                waited = time.monotonic() - received_at if received_at else 0
+                usage.record(name, interaction.guild_id, waited, error=True)
+            return Response(content=BUSY_RESPONSE, media_type="application/json")
+
+        name = interaction_name(interaction)
+        if name and profiler.should_profile(name):
+            with profiler.profile(name):
+                return await dispatch_interaction(interaction)
+
+        return await dispatch_interaction(interaction)
+
+
+@admin_router.get("/profiler")
+async def get_profiler_settings() -> ProfilerSettings:
+    return profiler.settings
+
+
+@admin_router.put("/profiler")
+async def update_profiler_settings(settings: ProfilerSettings) -> ProfilerSettings:
+    profiler.settings = settings
+    logger.info(
+        "Profiler set to sample rate %s, command %s",
+        settings.sample_rate,
+        settings.command,
+    )
+    return profiler.settings
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    watchdog = None
+    if loop_watchdog_enabled:
+        watchdog = LoopWatchdog(threshold=loop_stall_threshold_ms / 1000)
+        watchdog.start()
+
+    if traffic_capture:
+        traffic_capture.start()
+
+    sweeper.start()
+    usage.start()
+
+    yield
+
+    await usage.stop()
+    await sweeper.stop()
+
+    if traffic_capture:
+        await asyncio.to_thread(traffic_capture.stop)
+
+    await followups.close()
+    await download_client.aclose()
+    await asyncio.to_thread(hidden_posts.close)
+
+    if watchdog:
+        await watchdog.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ReceivedAtMiddleware)
 app.include_router(discord_router)
+app.include_router(admin_router)
+
+
+@app.get("/blobs/{digest}")
+async def get_blob(digest: str) -> FileResponse:
+    blob = await hidden_posts.get_blob(digest)
+    if blob is None:
+        raise HTTPException(status_code=404, detail="blob not found")
+
+    # blobs stored before content types were checked are served as plain bytes
+    media_type = blob.content_type
+    if normalize_content_type(media_type) not in ALLOWED_CONTENT_TYPES:
+        media_type = "application/octet-stream"
+
+    return FileResponse(
+        blob_store.path(blob.digest),
+        media_type=media_type,
+        headers={
+            "X-Content-Type-Options": "nosniff",
+            "Content-Disposition": f'inline; filename="{blob.digest}"',
+            "Content-Security-Policy": "default-src 'none'",
+        },
+    )
+
+
+@app.get("/healthz")
+async def healthz() -> dict:
+    return {"status": "ok", **admission.stats()}
+
+
+@app.get("/readyz")
+async def readyz() -> JSONResponse:
+    status = "ready" if admission.ready else "saturated"
+    return JSONResponse(
+        {"status": status, **admission.stats()},
+        status_code=200 if admission.ready else 503,
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    return metrics.render()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from loop_monitor import create_tracked_task
+from metrics import metrics
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one in-flight computation,
+    then keeps the result in a small hot cache for a short TTL so a burst of
+    identical requests only does the work once
+    """
+
+    def __init__(self, name: str, ttl: float = 2.0, max_entries: int = 128) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._hot: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:  # noqa: ANN401
+        entry = self._hot.get(key)
+        if entry is not None:
+            if entry[0] >= time.monotonic():
+                self._hot.move_to_end(key)
+                metrics.inc("single_flight_hot_hits_total", component=self.name)
+                return entry[1]
+            del self._hot[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            metrics.inc("single_flight_calls_total", component=self.name)
+            # the stall watchdog and profiler attribute the work to the caller
+            task = create_tracked_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            metrics.inc("single_flight_coalesced_total", component=self.name)
+
+        # a cancelled caller must not cancel the computation other callers share
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+
+        if task.cancelled() or task.exception() is not None or not task.result():
+            return
+
+        self._hot[key] = (time.monotonic() + self.ttl, task.result())
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.max_entries:
+            self._hot.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._hot.pop(key, None)
+
+    def clear(self) -> None:
+        self._hot.clear()
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+
+from config import database_path, post_ttl_seconds
+from pagination import paginate
+
+T = TypeVar("T")
+
+# PRAGMA auto_vacuum value for incremental mode
+INCREMENTAL_VACUUM = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hidden_posts (
+    id TEXT PRIMARY KEY,
+    author_id TEXT,
+    content TEXT NOT NULL,
+    attachments TEXT NOT NULL DEFAULT '[]',
+    created_at REAL NOT NULL,
+    page_count INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS hidden_posts_expires_at ON hidden_posts (expires_at);
+
+-- content split into message sized pages once, when the post is stored
+CREATE TABLE IF NOT EXISTS hidden_post_pages (
+    post_id TEXT NOT NULL REFERENCES hidden_posts (id) ON DELETE CASCADE,
+    page INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (post_id, page)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    content_type TEXT,
+    created_at REAL NOT NULL
+);
+
+-- the blobs each post refers to, indexed on the digest so the sweeper can tell a
+-- blob is unreferenced without reading every post's attachments
+CREATE TABLE IF NOT EXISTS post_blobs (
+    post_id TEXT NOT NULL REFERENCES hidden_posts (id) ON DELETE CASCADE,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (post_id, digest)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS post_blobs_digest ON post_blobs (digest);
+"""
+
+
+class StoredBlob(BaseModel):
+    digest: str
+    size: int
+    content_type: str | None = None
+
+
+class HiddenPost(BaseModel):
+    id: str
+    author_id: str | None = None
+    content: str
+    # digests of the post's attachments in the blob store
+    attachments: list[str] = []
+    created_at: float
+    page_count: int = 1
+    expires_at: float | None = None
+
+
+class HiddenPostPage(BaseModel):
+    post_id: str
+    index: int
+    count: int
+    content: str
+    attachments: list[str] = []
+
+
+class HiddenPostStore:
+    """
+    SQLite backed storage for hidden posts and the metadata of their attachment
+    blobs. sqlite3 blocks, so queries run on a worker thread and share a single
+    connection behind a lock.
+    """
+
+    def __init__(self, path: str, ttl: float) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA foreign_keys = ON")
+            # only takes effect on a new database, compact() converts older ones
+            self._db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self._db.executescript(SCHEMA)
+
+        return self._db
+
+    def _transaction(self, work: Callable[[sqlite3.Connection], T]) -> T:
+        with self._lock:
+            db = self._connection()
+            with db:
+                return work(db)
+
+    async def transaction(self, work: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Run `work` on the worker thread inside a single transaction
+        """
+        return await asyncio.to_thread(self._transaction, work)
+
+    async def execute(self, query: str, parameters: tuple = ()) -> list[sqlite3.Row]:
+        return await self.transaction(
+            lambda db: db.execute(query, parameters).fetchall(),
+        )
+
+    async def create_post(
+        self,
+        content: str,
+        author_id: str | None = None,
+        attachments: list[str] | None = None,
+    ) -> HiddenPost:
+        pages = paginate(content)
+        created_at = time.time()
+        post = HiddenPost(
+            id=secrets.token_urlsafe(12),
+            author_id=author_id,
+            content=content,
+            attachments=attachments or [],
+            created_at=created_at,
+            page_count=len(pages),
+            expires_at=created_at + self.ttl,
+        )
+
+        def insert(db: sqlite3.Connection) -> None:
+            db.execute(
+                "INSERT INTO hidden_posts"
+                " (id, author_id, content, attachments, created_at, page_count,"
+                " expires_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    post.id,
+                    post.author_id,
+                    post.content,
+                    json.dumps(post.attachments),
+                    post.created_at,
+                    post.page_count,
+                    post.expires_at,
+                ),
+            )
+            db.executemany(
+                "INSERT INTO hidden_post_pages (post_id, page, content)"
+                " VALUES (?, ?, ?)",
+                [(post.id, index, page) for index, page in enumerate(pages)],
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO post_blobs (post_id, digest) VALUES (?, ?)",
+                [(post.id, digest) for digest in post.attachments],
+            )
+
+        await self.transaction(insert)
+        return post
+
+    async def get_post(self, post_id: str) -> HiddenPost | None:
+        rows = await self.execute(
+            "SELECT * FROM hidden_posts WHERE id = ? AND expires_at > ?",
+            (post_id, time.time()),
+        )
+        if not rows:
+            return None
+
+        row: dict[str, Any] = dict(rows[0])
+        row["attachments"] = json.loads(row["attachments"])
+        return HiddenPost(**row)
+
+    async def get_page(self, post_id: str, index: int) -> HiddenPostPage | None:
+        """
+        A single page of a post, without loading the rest of its content
+        """
+        rows = await self.execute(
+            "SELECT hidden_posts.attachments, hidden_posts.page_count,"
+            " hidden_post_pages.content"
+            " FROM hidden_post_pages"
+            " JOIN hidden_posts ON hidden_posts.id = hidden_post_pages.post_id"
+            " WHERE hidden_post_pages.post_id = ? AND hidden_post_pages.page = ?"
+            " AND hidden_posts.expires_at > ?",
+            (post_id, index, time.time()),
+        )
+        if not rows:
+            return None
+
+        return HiddenPostPage(
+            post_id=post_id,
+            index=index,
+            count=rows[0]["page_count"],
+            content=rows[0]["content"],
+            attachments=json.loads(rows[0]["attachments"]),
+        )
+
+    async def add_blob(self, blob: StoredBlob) -> None:
+        await self.execute(
+            "INSERT INTO blobs (digest, size, content_type, created_at)"
+            " VALUES (?, ?, ?, ?)"
+            # a new reference restarts the grace period before the blob can be
+            # collected
+            " ON CONFLICT (digest) DO UPDATE SET created_at = excluded.created_at",
+            (blob.digest, blob.size, blob.content_type, time.time()),
+        )
+
+    async def get_blob(self, digest: str) -> StoredBlob | None:
+        rows = await self.execute(
+            "SELECT digest, size, content_type FROM blobs WHERE digest = ?",
+            (digest,),
+        )
+        if not rows:
+            return None
+
+        return StoredBlob(**dict(rows[0]))
+
+    async def expire_posts(self, now: float, limit: int) -> int:
+        """
+        Delete up to `limit` posts that expired before `now`, their pages go with
+        them
+        """
+        rows = await self.execute(
+            "DELETE FROM hidden_posts WHERE id IN"
+            " (SELECT id FROM hidden_posts WHERE expires_at <= ? LIMIT ?)"
+            " RETURNING id",
+            (now, limit),
+        )
+        return len(rows)
+
+    async def delete_unreferenced_blobs(
+        self,
+        older_than: float,
+        limit: int,
+    ) -> list[StoredBlob]:
+        """
+        Forget up to `limit` blobs that no post refers to anymore, returning them
+        so their files can be removed
+        """
+        rows = await self.execute(
+            "DELETE FROM blobs WHERE digest IN"
+            " (SELECT digest FROM blobs WHERE created_at < ? AND NOT EXISTS"
+            "  (SELECT 1 FROM post_blobs WHERE post_blobs.digest = blobs.digest)"
+            " LIMIT ?)"
+            " RETURNING digest, size, content_type",
+            (older_than, limit),
+        )
+        return [StoredBlob(**dict(row)) for row in rows]
+
+    def _compact(self, db: sqlite3.Connection, pages: int) -> int:
+        def size() -> int:
+            page_count = db.execute("PRAGMA page_count").fetchone()[0]
+            return page_count * db.execute("PRAGMA page_size").fetchone()[0]
+
+        before = size()
+        if db.execute("PRAGMA auto_vacuum").fetchone()[0] != INCREMENTAL_VACUUM:
+            # a one off full rewrite, needed to switch an older database over
+            db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            db.execute("VACUUM")
+        else:
+            # execute() only steps the pragma once, freeing a single page,
+            # executescript() runs it to completion
+            db.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+
+        return before - size()
+
+    async def compact(self, pages: int) -> int:
+        """
+        Give up to `pages` free database pages back to the filesystem, returning
+        the number of bytes reclaimed
+        """
+        return await self.transaction(lambda db: self._compact(db, pages))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db:
+                self._db.close()
+                self._db = None
+
+
+hidden_posts = HiddenPostStore(database_path, ttl=post_ttl_seconds)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from contextlib import suppress
+
+from attachments import BlobStore
+from helpers import configure_logging
+from metrics import metrics
+from store import HiddenPostStore
+
+logger = configure_logging(__name__)
+
+# blobs get this long to be attached to a post before they can be collected
+BLOB_GRACE_SECONDS = 600
+
+
+def parse_window(window: str) -> tuple[int, int]:
+    """
+    Parse a "start-end" range of UTC hours like "3-5"
+    """
+    start, end = (int(hour) for hour in window.split("-"))
+    return start, end
+
+
+class Sweeper:
+    """
+    Background maintenance for the hidden post store. Every interval it deletes
+    expired posts and the blobs nobody refers to anymore, in small batches and
+    within a time budget so the database lock is never held for long. During the
+    off-peak window it also gives free database pages back to the filesystem.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        store: HiddenPostStore,
+        blobs: BlobStore,
+        interval: float = 60,
+        batch_size: int = 200,
+        time_budget: float = 0.25,
+        compaction_window: tuple[int, int] = (3, 5),
+        compaction_pages: int = 1024,
+    ) -> None:
+        self.store = store
+        self.blobs = blobs
+        self.interval = interval
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.compaction_window = compaction_window
+        self.compaction_pages = compaction_pages
+
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        logger.info("Sweeper started, running every %ss", self.interval)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+
+        self._task = None
+
+    def off_peak(self, now: float | None = None) -> bool:
+        hour = time.gmtime(now).tm_hour
+        start, end = self.compaction_window
+
+        # windows can wrap around midnight, like 22-2
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+                if self.off_peak():
+                    await self.compact()
+            except Exception as exc:
+                logger.exception("Sweep failed", exc_info=exc)
+
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> None:
+        started = time.monotonic()
+        deadline = started + self.time_budget
+
+        expired = 0
+        while time.monotonic() < deadline:
+            count = await self.store.expire_posts(time.time(), self.batch_size)
+            expired += count
+            if count < self.batch_size:
+                break
+
+        reclaimed = 0
+        while time.monotonic() < deadline:
+            older_than = time.time() - BLOB_GRACE_SECONDS
+            blobs = await self.store.delete_unreferenced_blobs(
+                older_than,
+                self.batch_size,
+            )
+            for blob in blobs:
+                if await asyncio.to_thread(self.blobs.remove, blob.digest, older_than):
+                    reclaimed += blob.size
+
+            metrics.inc("sweeper_deleted_blobs_total", len(blobs))
+            if len(blobs) < self.batch_size:
+                break
+
+        duration = time.monotonic() - started
+        metrics.inc("sweeper_expired_posts_total", expired)
+        metrics.inc("sweeper_reclaimed_bytes_total", reclaimed, storage="blobs")
+        metrics.observe("sweeper_sweep_seconds", duration)
+
+        if expired or reclaimed:
+            logger.info(
+                "Expired %s posts and reclaimed %s blob bytes in %.3fs",
+                expired,
+                reclaimed,
+                duration,
+            )
+
+    async def compact(self) -> None:
+        started = time.monotonic()
+        reclaimed = await self.store.compact(self.compaction_pages)
+        duration = time.monotonic() - started
+
+        metrics.inc("sweeper_reclaimed_bytes_total", reclaimed, storage="database")
+        metrics.observe("sweeper_compaction_seconds", duration)
+
+        if reclaimed:
+            logger.info("Compaction reclaimed %s bytes in %.3fs", reclaimed, duration)
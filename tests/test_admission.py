@@ -0,0 +1,108 @@
+import asyncio
+import time
+import unittest
+
+from admission import AdmissionController
+from metrics import metrics
+
+
+class AdmissionControllerTest(unittest.IsolatedAsyncioTestCase):
+    async def hold(
+        self,
+        admission: AdmissionController,
+        seconds: float,
+        admitted: asyncio.Event | None = None,
+    ) -> bool:
+        async with admission.slot() as ok:
+            if admitted:
+                admitted.set()
+            if ok:
+                await asyncio.sleep(seconds)
+            return ok
+
+    async def test_free_slot_is_admitted(self) -> None:
+        admission = AdmissionController(max_inflight=2, deadline=0.5)
+        # a slow history doesn't shed requests that don't have to queue
+        admission.service_time = 10
+
+        async with admission.slot() as first, admission.slot() as second:
+            self.assertTrue(first)
+            self.assertTrue(second)
+            self.assertEqual(admission.inflight, 2)
+
+        self.assertEqual(admission.inflight, 0)
+
+    async def test_sheds_when_the_wait_would_miss_the_deadline(self) -> None:
+        admission = AdmissionController(max_inflight=1, deadline=0.5)
+        admission.service_time = 1.0
+        shed = metrics.get("admission_shed_total", reason="projected_wait")
+
+        admitted = asyncio.Event()
+        holder = asyncio.create_task(self.hold(admission, 0.1, admitted))
+        await admitted.wait()
+
+        started = time.monotonic()
+        async with admission.slot() as ok:
+            self.assertFalse(ok)
+        self.assertLess(time.monotonic() - started, 0.05)
+
+        self.assertEqual(
+            metrics.get("admission_shed_total", reason="projected_wait"),
+            shed + 1,
+        )
+        self.assertTrue(admission.shedding)
+        self.assertFalse(admission.ready)
+        self.assertTrue(await holder)
+
+    async def test_waits_for_a_slot_within_the_budget(self) -> None:
+        admission = AdmissionController(max_inflight=1, deadline=0.5)
+
+        admitted = asyncio.Event()
+        holder = asyncio.create_task(self.hold(admission, 0.05, admitted))
+        await admitted.wait()
+
+        async with admission.slot() as ok:
+            self.assertTrue(ok)
+
+        await holder
+        self.assertEqual(admission.waiting, 0)
+
+    async def test_times_out_waiting_for_a_slot(self) -> None:
+        admission = AdmissionController(max_inflight=1, deadline=0.2)
+        timeouts = metrics.get("admission_shed_total", reason="timeout")
+
+        admitted = asyncio.Event()
+        holder = asyncio.create_task(self.hold(admission, 0.5, admitted))
+        await admitted.wait()
+
+        started = time.monotonic()
+        async with admission.slot() as ok:
+            self.assertFalse(ok)
+        self.assertLess(time.monotonic() - started, 0.3)
+
+        self.assertEqual(
+            metrics.get("admission_shed_total", reason="timeout"),
+            timeouts + 1,
+        )
+        self.assertEqual(admission.waiting, 0)
+        await holder
+
+    async def test_slot_handed_to_a_waiter_is_not_free(self) -> None:
+        admission = AdmissionController(max_inflight=1, deadline=0.3)
+
+        async with admission.slot():
+            waiter = asyncio.create_task(self.hold(admission, 1.0))
+            await asyncio.sleep(0.01)
+
+        # the slot now belongs to the waiter, which hasn't resumed yet
+        self.assertEqual(admission.inflight, 0)
+        started = time.monotonic()
+        async with admission.slot() as ok:
+            self.assertFalse(ok)
+        self.assertLess(time.monotonic() - started, admission.deadline)
+
+        self.assertTrue(await waiter)
+
+
+if __name__ == "__main__":
+    unittest.main()
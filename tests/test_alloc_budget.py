@@ -0,0 +1,30 @@
+import asyncio
+import logging
+import unittest
+from unittest.mock import patch
+
+import alloc_budget
+
+# the cli's default, the baseline was recorded with it and the first requests
+# keep more alive while the caches fill
+ITERATIONS = 30
+
+
+class AllocBudgetTest(unittest.TestCase):
+    def test_scenarios_within_budget(self) -> None:
+        baseline = alloc_budget.load_baseline()
+        # a test runner capturing logs on the root logger keeps every record, the
+        # app doesn't
+        with patch.object(logging.root, "handlers", []):
+            results = asyncio.run(alloc_budget.run(ITERATIONS))
+
+        self.assertEqual(set(results), set(baseline))
+        for name, (result, diffs) in results.items():
+            with self.subTest(scenario=name):
+                problems = alloc_budget.check_scenario(result, baseline[name])
+                report = alloc_budget.stage_report(result, baseline[name], diffs)
+                self.assertEqual(problems, [], "\n".join(report))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import sqlite3
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from analytics import (
+    LATENCY_BUCKETS_MS,
+    OVERFLOW_GUILD,
+    UsageRecorder,
+    percentile_bound,
+    query_usage,
+)
+from store import HiddenPostStore
+
+
+class UsageRecorderTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = HiddenPostStore(str(Path(self.directory.name) / "shh.db"), ttl=60)
+
+    async def asyncTearDown(self) -> None:
+        self.store.close()
+        self.directory.cleanup()
+
+    async def usage(self, group_by: str = "interaction") -> dict:
+        summaries = await query_usage(self.store, time.time() - 3600, group_by)
+        return {(usage.interaction, usage.guild_id): usage for usage in summaries}
+
+    async def test_flush_round_trip(self) -> None:
+        recorder = UsageRecorder(self.store)
+        recorder.record("shh", "1", 0.020)
+        recorder.record("shh", None, 0.040, error=True)
+        recorder.record("reveal", "1", 0.005)
+        await recorder.flush()
+
+        # a second flush adds to the same hourly rows
+        recorder.record("shh", "1", 0.060)
+        await recorder.flush()
+
+        usage = await self.usage()
+        shh = usage[("shh", "*")]
+        self.assertEqual(shh.invocations, 3)
+        self.assertEqual(shh.errors, 1)
+        self.assertAlmostEqual(shh.latency_avg_ms, 40)
+        self.assertAlmostEqual(shh.latency_max_ms, 60)
+        self.assertEqual(usage[("reveal", "*")].invocations, 1)
+
+        by_guild = await self.usage("guild")
+        self.assertEqual(by_guild[("shh", "1")].invocations, 2)
+        self.assertEqual(by_guild[("shh", "dm")].invocations, 1)
+
+    async def test_failed_flush_keeps_the_counts(self) -> None:
+        recorder = UsageRecorder(self.store)
+        recorder.record("shh", "1", 0.500, error=True)
+
+        async def failing_write(_: object) -> None:
+            # counted while the write is in flight, merged with the restored counts
+            recorder.record("shh", "1", 0.100)
+            msg = "database is locked"
+            raise sqlite3.OperationalError(msg)
+
+        with (
+            patch.object(self.store, "transaction", side_effect=failing_write),
+            self.assertRaises(sqlite3.OperationalError),
+        ):
+            await recorder.flush()
+
+        await recorder.flush()
+
+        shh = (await self.usage())[("shh", "*")]
+        self.assertEqual(shh.invocations, 2)
+        self.assertEqual(shh.errors, 1)
+        self.assertAlmostEqual(shh.latency_avg_ms, 300)
+        # the max is kept, not summed
+        self.assertAlmostEqual(shh.latency_max_ms, 500)
+
+    async def test_guilds_past_the_limit_are_folded(self) -> None:
+        recorder = UsageRecorder(self.store, max_keys=2)
+        for guild_id in ("1", "2", "3", "4", "1"):
+            recorder.record("shh", guild_id, 0.010)
+        await recorder.flush()
+
+        by_guild = await self.usage("guild")
+        self.assertEqual(by_guild[("shh", "1")].invocations, 2)
+        self.assertEqual(by_guild[("shh", "2")].invocations, 1)
+        self.assertEqual(by_guild[("shh", OVERFLOW_GUILD)].invocations, 2)
+        self.assertNotIn(("shh", "3"), by_guild)
+
+
+class PercentileBoundTest(unittest.TestCase):
+    def buckets(self, **counts: int) -> list[int]:
+        bounds = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+        return [counts.get(bound, 0) for bound in bounds]
+
+    def test_bound_of_the_bucket_reaching_the_fraction(self) -> None:
+        buckets = self.buckets(le_10=90, le_50=8, le_500=2)
+
+        self.assertEqual(percentile_bound(buckets, 0.5, 800), 10)
+        self.assertEqual(percentile_bound(buckets, 0.95, 800), 50)
+        self.assertEqual(percentile_bound(buckets, 0.99, 800), 500)
+
+    def test_never_above_the_slowest_call(self) -> None:
+        self.assertEqual(percentile_bound(self.buckets(le_500=1), 0.95, 120), 120)
+
+    def test_overflow_bucket_is_the_slowest_call(self) -> None:
+        buckets = self.buckets(le_10=1, le_inf=99)
+        self.assertEqual(percentile_bound(buckets, 0.95, 7300), 7300)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import hashlib
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+from attachments import AttachmentTooLargeError, BlobStore, UnsupportedAttachmentError
+from discord_api import Attachment
+from metrics import metrics
+
+MAX_BYTES = 64 * 1024
+FILES = {
+    "/small.png": b"\x89PNG" + b"a" * 1000,
+    "/large.png": b"\x89PNG" + b"b" * (MAX_BYTES * 2),
+}
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        path, _, query = self.path.partition("?")
+        content = FILES.get(path)
+        if content is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        # without a length the size cap has to be enforced while streaming
+        if query != "unsized":
+            self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *_: object) -> None:
+        pass
+
+
+class BlobStoreTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = BlobStore(self.directory.name, MAX_BYTES, chunk_size=4096)
+        self.client = httpx.AsyncClient(base_url=self.base_url)
+
+    async def asyncTearDown(self) -> None:
+        await self.client.aclose()
+        self.directory.cleanup()
+
+    def stored_files(self) -> list[Path]:
+        return [path for path in Path(self.directory.name).rglob("*") if path.is_file()]
+
+    def attachment(self, path: str, size: int, content_type: str) -> Attachment:
+        return Attachment(
+            id="1",
+            filename="image.png",
+            size=size,
+            url=f"{self.base_url}{path}",
+            proxy_url=f"{self.base_url}{path}",
+            content_type=content_type,
+        )
+
+    async def test_download_streams_and_hashes(self) -> None:
+        digest, size = await self.store.download(self.client, "/small.png")
+
+        content = FILES["/small.png"]
+        self.assertEqual(digest, hashlib.sha256(content).hexdigest())
+        self.assertEqual(size, len(content))
+        self.assertEqual(self.store.path(digest).read_bytes(), content)
+
+    async def test_duplicate_upload_is_stored_once(self) -> None:
+        hits = metrics.get("blob_dedup_hits_total")
+
+        first, _ = await self.store.download(self.client, "/small.png")
+        second, _ = await self.store.download(self.client, "/small.png")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.stored_files(), [self.store.path(first)])
+        self.assertEqual(metrics.get("blob_dedup_hits_total"), hits + 1)
+
+    async def test_refuses_file_over_the_cap(self) -> None:
+        for url in ("/large.png", "/large.png?unsized"):
+            with self.subTest(url=url), self.assertRaises(AttachmentTooLargeError):
+                await self.store.download(self.client, url)
+
+        # nothing is left behind, not even the spool file
+        self.assertEqual(self.stored_files(), [])
+
+    async def test_check_refuses_before_downloading(self) -> None:
+        too_large = self.attachment("/small.png", MAX_BYTES + 1, "image/png")
+        with self.assertRaises(AttachmentTooLargeError):
+            await self.store.ingest(self.client, too_large)
+
+        svg = self.attachment("/small.png", 100, "image/svg+xml")
+        with self.assertRaises(UnsupportedAttachmentError):
+            await self.store.ingest(self.client, svg)
+
+        self.assertEqual(self.stored_files(), [])
+
+    async def test_ingest_normalizes_content_type(self) -> None:
+        attachment = self.attachment("/small.png", 1004, "image/PNG; charset=binary")
+        blob = await self.store.ingest(self.client, attachment)
+
+        self.assertEqual(blob.content_type, "image/png")
+        self.assertEqual(blob.size, len(FILES["/small.png"]))
+
+    async def test_remove_keeps_a_blob_stored_again(self) -> None:
+        digest, _ = await self.store.download(self.client, "/small.png")
+        collected_at = time.time()
+        # an upload of the same content deduplicated against the file after the
+        # sweeper picked it up
+        await self.store.download(self.client, "/small.png")
+
+        self.assertFalse(self.store.remove(digest, older_than=collected_at - 60))
+        self.assertTrue(self.store.path(digest).exists())
+
+        self.assertTrue(self.store.remove(digest, older_than=time.time() + 60))
+        self.assertEqual(self.stored_files(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
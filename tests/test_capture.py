@@ -0,0 +1,133 @@
+import copy
+import json
+import unittest
+
+from capture import REDACTED_URL, redact
+
+SALT = b"salt"
+AUTHOR_ID = "111111111111111111"
+CLICKER_ID = "222222222222222222"
+SECRETS = (
+    "interaction-token",
+    AUTHOR_ID,
+    CLICKER_ID,
+    "alice",
+    "Alice A",
+    "holiday.png",
+    "a photo of the beach",
+    "hidden message text",
+    "cdn.discordapp.com",
+    "shh.example.com/blobs",
+)
+
+COMMAND = {
+    "type": 2,
+    "id": "1",
+    "application_id": "2",
+    "token": "interaction-token",
+    "version": 1,
+    "guild_id": "3",
+    "member": {
+        "nick": "Alice A",
+        "user": {"id": AUTHOR_ID, "username": "alice", "global_name": "Alice A"},
+    },
+    "authorizing_integration_owners": {"1": AUTHOR_ID},
+    "data": {
+        "id": "4",
+        "name": "shh",
+        "type": 1,
+        "options": [
+            {"name": "message", "type": 3, "value": "hidden message text"},
+            {"name": "image", "type": 11, "value": "5"},
+        ],
+        "resolved": {
+            "attachments": {
+                "5": {
+                    "id": "5",
+                    "filename": "holiday.png",
+                    "description": "a photo of the beach",
+                    "content_type": "image/png",
+                    "size": 2048,
+                    "url": "https://cdn.discordapp.com/attachments/1/5/holiday.png?ex=1&hm=2",
+                    "proxy_url": "https://media.discordapp.net/attachments/1/5/holiday.png",
+                },
+            },
+        },
+    },
+}
+
+PAGE_TURN = {
+    "type": 3,
+    "id": "6",
+    "application_id": "2",
+    "token": "interaction-token",
+    "version": 1,
+    "user": {"id": CLICKER_ID, "username": "bob"},
+    "data": {"custom_id": "reveal:abc:1", "component_type": 2},
+    "message": {
+        "id": "7",
+        "content": "hidden message text",
+        "author": {"id": "2", "username": "shh"},
+        "mentions": [{"id": AUTHOR_ID, "username": "alice"}],
+        "interaction_metadata": {"id": "1", "type": 3, "user": {"id": CLICKER_ID}},
+        "embeds": [
+            {
+                "type": "image",
+                "image": {
+                    "url": "https://shh.example.com/blobs/0123",
+                    "proxy_url": "https://images-ext.discordapp.net/shh.example.com/blobs/0123",
+                    "width": 100,
+                    "height": 100,
+                },
+            },
+        ],
+    },
+}
+
+
+class RedactTest(unittest.TestCase):
+    def assert_redacted(self, payload: dict) -> dict:
+        redacted = redact(copy.deepcopy(payload), SALT)
+        text = json.dumps(redacted)
+
+        for secret in SECRETS:
+            self.assertNotIn(secret, text)
+
+        return redacted
+
+    def test_command_with_attachment(self) -> None:
+        redacted = self.assert_redacted(COMMAND)
+
+        attachment = redacted["data"]["resolved"]["attachments"]["5"]
+        self.assertEqual(attachment["url"], REDACTED_URL)
+        self.assertEqual(attachment["proxy_url"], REDACTED_URL)
+        # what the app checks before downloading is kept, so replays behave alike
+        self.assertEqual(attachment["size"], 2048)
+        self.assertEqual(attachment["content_type"], "image/png")
+        self.assertEqual(len(attachment["filename"]), len("holiday.png"))
+
+        message = redacted["data"]["options"][0]["value"]
+        self.assertEqual(len(message), len("hidden message text"))
+
+    def test_page_turn_on_a_revealed_post(self) -> None:
+        redacted = self.assert_redacted(PAGE_TURN)
+
+        image = redacted["message"]["embeds"][0]["image"]
+        self.assertEqual(image["url"], REDACTED_URL)
+        self.assertEqual(redacted["data"]["custom_id"], "reveal:abc:1")
+
+    def test_user_ids_are_stable(self) -> None:
+        command = redact(copy.deepcopy(COMMAND), SALT)
+        page_turn = redact(copy.deepcopy(PAGE_TURN), SALT)
+
+        author = command["member"]["user"]["id"]
+        self.assertEqual(command["authorizing_integration_owners"]["1"], author)
+        self.assertEqual(page_turn["message"]["mentions"][0]["id"], author)
+        self.assertEqual(
+            page_turn["user"]["id"],
+            page_turn["message"]["interaction_metadata"]["user"]["id"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+
+import httpx
+
+from discord_emulator import LOADING_FLAG, EmulatorSettings, build_app
+
+BOT_HEADERS = {"Authorization": "Bot token"}
+COMMANDS_URL = "/api/v10/applications/1/commands"
+
+
+class DiscordEmulatorTest(unittest.IsolatedAsyncioTestCase):
+    def client(self, **settings: float) -> httpx.AsyncClient:
+        settings.setdefault("global_rate_limit", 0)
+        return httpx.AsyncClient(
+            base_url="http://discord.test",
+            transport=httpx.ASGITransport(app=build_app(EmulatorSettings(**settings))),
+        )
+
+    async def test_rate_limit(self) -> None:
+        async with self.client(rate_limit=2, rate_window=60) as client:
+            first = await client.get(COMMANDS_URL, headers=BOT_HEADERS)
+            await client.get(COMMANDS_URL, headers=BOT_HEADERS)
+            limited = await client.get(COMMANDS_URL, headers=BOT_HEADERS)
+            # other routes are in their own bucket
+            other = await client.get(
+                "/api/v10/applications/1/guilds/2/commands",
+                headers=BOT_HEADERS,
+            )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers["X-RateLimit-Limit"], "2")
+        self.assertEqual(first.headers["X-RateLimit-Remaining"], "1")
+
+        self.assertEqual(limited.status_code, 429)
+        self.assertGreater(limited.json()["retry_after"], 0)
+        self.assertFalse(limited.json()["global"])
+        self.assertEqual(limited.headers["X-RateLimit-Remaining"], "0")
+        self.assertEqual(limited.headers["X-RateLimit-Scope"], "user")
+        self.assertEqual(
+            limited.headers["X-RateLimit-Bucket"],
+            first.headers["X-RateLimit-Bucket"],
+        )
+        self.assertGreater(float(limited.headers["X-RateLimit-Reset-After"]), 0)
+        self.assertIn("Retry-After", limited.headers)
+
+        self.assertEqual(other.status_code, 200)
+
+    async def test_global_rate_limit(self) -> None:
+        async with self.client(global_rate_limit=1) as client:
+            await client.get(COMMANDS_URL, headers=BOT_HEADERS)
+            limited = await client.get(
+                "/api/v10/applications/1/guilds/2/commands",
+                headers=BOT_HEADERS,
+            )
+
+        self.assertEqual(limited.status_code, 429)
+        self.assertTrue(limited.json()["global"])
+        self.assertEqual(limited.headers["X-RateLimit-Global"], "true")
+
+    async def test_bulk_overwrite_keeps_ids_of_unchanged_names(self) -> None:
+        async with self.client() as client:
+            first = await client.put(
+                COMMANDS_URL,
+                headers=BOT_HEADERS,
+                json=[{"name": "shh", "description": "old"}, {"name": "gone"}],
+            )
+            second = await client.put(
+                COMMANDS_URL,
+                headers=BOT_HEADERS,
+                json=[{"name": "shh", "description": "new"}, {"name": "added"}],
+            )
+            listed = await client.get(COMMANDS_URL, headers=BOT_HEADERS)
+
+        before = {command["name"]: command for command in first.json()}
+        after = {command["name"]: command for command in second.json()}
+
+        self.assertEqual(after["shh"]["id"], before["shh"]["id"])
+        self.assertEqual(after["shh"]["description"], "new")
+        self.assertNotEqual(after["added"]["id"], before["gone"]["id"])
+        self.assertEqual(
+            sorted(command["name"] for command in listed.json()),
+            ["added", "shh"],
+        )
+
+    async def test_deferred_callback_then_edit_original(self) -> None:
+        original_url = "/api/v10/webhooks/1/token/messages/@original"
+
+        async with self.client() as client:
+            missing = await client.get(original_url)
+            callback = await client.post(
+                "/api/v10/interactions/9/token/callback",
+                json={"type": 5},
+            )
+            deferred = await client.get(original_url)
+            edited = await client.patch(original_url, json={"content": "done"})
+            fetched = await client.get(original_url)
+
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(missing.json()["code"], 10008)
+        self.assertEqual(callback.status_code, 204)
+
+        self.assertTrue(deferred.json()["flags"] & LOADING_FLAG)
+        self.assertEqual(deferred.json()["interaction_metadata"], {"id": "9"})
+
+        self.assertEqual(edited.json()["id"], deferred.json()["id"])
+        self.assertFalse(edited.json()["flags"] & LOADING_FLAG)
+        self.assertEqual(fetched.json()["content"], "done")
+
+    async def test_error_rate(self) -> None:
+        async with self.client(error_rate=1) as client:
+            failed = await client.get(COMMANDS_URL, headers=BOT_HEADERS)
+        async with self.client(error_rate=0) as client:
+            succeeded = await client.get(COMMANDS_URL, headers=BOT_HEADERS)
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(
+            failed.json(),
+            {"message": "500: Internal Server Error", "code": 0},
+        )
+        self.assertEqual(succeeded.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from pagination import open_fence, open_spans, paginate
+
+LIMIT = 200
+
+
+class PaginateTest(unittest.TestCase):
+    def assert_balanced(self, pages: list[str]) -> None:
+        for page in pages:
+            self.assertLessEqual(len(page), LIMIT)
+            self.assertIsNone(open_fence(page))
+            self.assertEqual(open_spans(page), [])
+
+    def test_spoiler_split_over_pages(self) -> None:
+        pages = paginate("||secret " + "word " * 100 + "end||", LIMIT)
+
+        self.assertGreater(len(pages), 2)
+        self.assert_balanced(pages)
+        for page in pages:
+            self.assertTrue(page.startswith("||"))
+            self.assertTrue(page.endswith("||"))
+
+    def test_nested_spans_reopen_in_order(self) -> None:
+        pages = paginate("||**loud " + "word " * 60 + "end**||", LIMIT)
+
+        self.assert_balanced(pages)
+        self.assertTrue(pages[0].endswith("**||"))
+        self.assertTrue(pages[1].startswith("||**"))
+
+    def test_markers_in_code_are_ignored(self) -> None:
+        self.assertEqual(open_spans("`**` and\n```\n||\n```\n* item\n2 * 3"), [])
+
+    def test_fences_still_carried(self) -> None:
+        pages = paginate("```py\n" + "x = 1\n" * 60 + "```", LIMIT)
+
+        self.assert_balanced(pages)
+        self.assertTrue(pages[1].startswith("```py\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import shh
+from analytics import UsageCall
+from discord_api import DiscordInteraction, InteractionMessage
+from interactions.commands import InteractionResult
+from response_cache import CacheScope, ResponseCache, ResponseCachePolicy
+
+
+def interaction(
+    options: list[dict],
+    guild_id: str | None = None,
+    user_id: str = "3",
+    locale: str = "en-US",
+) -> DiscordInteraction:
+    return DiscordInteraction.model_validate(
+        {
+            "application_id": "1",
+            "id": "2",
+            "token": "token",
+            "version": 1,
+            "type": 2,
+            "guild_id": guild_id,
+            "locale": locale,
+            "user": {"id": user_id},
+            "data": {"id": "4", "name": "shh", "type": 1, "options": options},
+        },
+    )
+
+
+class ResponseCacheKeyTest(unittest.TestCase):
+    def test_options_are_sorted(self) -> None:
+        cache = ResponseCache("shh", ResponseCachePolicy())
+        first = [
+            {"name": "a", "type": 3, "value": "1"},
+            {"name": "b", "type": 3, "value": "2"},
+        ]
+
+        self.assertEqual(
+            cache.key(interaction(first)),
+            cache.key(interaction(list(reversed(first)))),
+        )
+
+    def test_subcommands_extend_the_path(self) -> None:
+        cache = ResponseCache("shh", ResponseCachePolicy())
+        options = [
+            {
+                "name": "sub",
+                "type": 1,
+                "options": [
+                    {"name": "b", "type": 3, "value": "2"},
+                    {"name": "a", "type": 3, "value": "1"},
+                ],
+            },
+        ]
+
+        path, values, *_ = cache.key(interaction(options))
+        self.assertEqual(path, ("shh", "sub"))
+        self.assertEqual(values, (("a", "1"), ("b", "2")))
+
+    def test_scope(self) -> None:
+        options = [{"name": "a", "type": 3, "value": "1"}]
+        in_guild = interaction(options, guild_id="10", user_id="3")
+        other_guild = interaction(options, guild_id="11", user_id="3")
+        other_user = interaction(options, guild_id="10", user_id="4")
+
+        shared = ResponseCache("shh", ResponseCachePolicy())
+        self.assertEqual(shared.key(in_guild), shared.key(other_guild))
+        self.assertNotEqual(
+            shared.key(in_guild),
+            shared.key(interaction(options, locale="fr")),
+        )
+
+        per_guild = ResponseCache("shh", ResponseCachePolicy(scope=CacheScope.GUILD))
+        self.assertNotEqual(per_guild.key(in_guild), per_guild.key(other_guild))
+        self.assertEqual(per_guild.key(in_guild), per_guild.key(other_user))
+
+        per_user = ResponseCache("shh", ResponseCachePolicy(scope=CacheScope.USER))
+        self.assertEqual(per_user.key(in_guild), per_user.key(other_guild))
+        self.assertNotEqual(per_user.key(in_guild), per_user.key(other_user))
+
+
+class ResponseCacheEntriesTest(unittest.TestCase):
+    def test_entries_expire(self) -> None:
+        cache = ResponseCache("shh", ResponseCachePolicy(ttl=10))
+
+        with patch("response_cache.time.monotonic", return_value=100):
+            cache.store(("key",), {"type": 4})
+        with patch("response_cache.time.monotonic", return_value=109):
+            self.assertIsNotNone(cache.get(("key",)))
+        with patch("response_cache.time.monotonic", return_value=111):
+            self.assertIsNone(cache.get(("key",)))
+
+    def test_least_recently_used_is_evicted(self) -> None:
+        cache = ResponseCache("shh", ResponseCachePolicy(max_entries=2))
+        cache.store(("a",), {"value": "a"})
+        cache.store(("b",), {"value": "b"})
+
+        cache.get(("a",))
+        cache.store(("c",), {"value": "c"})
+
+        self.assertIsNone(cache.get(("b",)))
+        self.assertEqual(json.loads(cache.get(("a",))), {"value": "a"})
+        self.assertEqual(json.loads(cache.get(("c",))), {"value": "c"})
+
+
+class CachedCommandTest(unittest.IsolatedAsyncioTestCase):
+    async def test_hit_skips_the_handler(self) -> None:
+        cache = ResponseCache("shh", ResponseCachePolicy())
+        handler = AsyncMock(
+            return_value=InteractionResult(
+                success=True,
+                reason="ok",
+                message=InteractionMessage(content="cached"),
+            ),
+        )
+        command = interaction([{"name": "message", "type": 3, "value": "hi"}])
+
+        with (
+            patch.dict(shh.command_caches, {"shh": cache}),
+            patch.dict(shh.command_router, {"shh": handler}),
+        ):
+            first = await shh.run_command(command, UsageCall())
+            second = await shh.run_command(command, UsageCall())
+
+        handler.assert_awaited_once()
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(json.loads(second.body)["data"]["content"], "cached")
+
+
+if __name__ == "__main__":
+    unittest.main()
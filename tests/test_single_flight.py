@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from loop_monitor import InteractionTracker
+from metrics import metrics
+from single_flight import SingleFlight
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one_computation(self) -> None:
+        flight = SingleFlight("test-coalesce")
+        release = asyncio.Event()
+        calls = 0
+
+        async def compute() -> str:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "result"
+
+        callers = [asyncio.create_task(flight.do("key", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await asyncio.gather(*callers), ["result"] * 3)
+        self.assertEqual(calls, 1)
+        self.assertEqual(
+            metrics.get("single_flight_coalesced_total", component="test-coalesce"),
+            2,
+        )
+
+    async def test_cancelled_caller_does_not_cancel_the_others(self) -> None:
+        flight = SingleFlight("test-shield")
+        release = asyncio.Event()
+
+        async def compute() -> str:
+            await release.wait()
+            return "result"
+
+        cancelled = asyncio.create_task(flight.do("key", compute))
+        waiting = asyncio.create_task(flight.do("key", compute))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await waiting, "result")
+        self.assertTrue(cancelled.cancelled())
+
+    async def test_hot_cache_expires(self) -> None:
+        flight = SingleFlight("test-ttl", ttl=2)
+        calls = 0
+
+        async def compute() -> int:
+            nonlocal calls
+            calls += 1
+            return calls
+
+        with patch("single_flight.time.monotonic", return_value=100):
+            self.assertEqual(await flight.do("key", compute), 1)
+        with patch("single_flight.time.monotonic", return_value=101):
+            self.assertEqual(await flight.do("key", compute), 1)
+        with patch("single_flight.time.monotonic", return_value=103):
+            self.assertEqual(await flight.do("key", compute), 2)
+
+    async def test_hot_cache_evicts_least_recently_used(self) -> None:
+        flight = SingleFlight("test-evict", max_entries=2)
+        calls: list[str] = []
+
+        def compute(key: str):  # noqa: ANN202
+            async def run() -> str:
+                calls.append(key)
+                return key
+
+            return run
+
+        for key in ("a", "b", "a", "c", "a", "b"):
+            await flight.do(key, compute(key))
+
+        self.assertEqual(calls, ["a", "b", "c", "b"])
+
+    async def test_computation_inherits_the_callers_interaction(self) -> None:
+        trackers = [InteractionTracker(), InteractionTracker()]
+        loop = asyncio.get_running_loop()
+        flight = SingleFlight("test-tracking")
+
+        async def compute() -> list[str | None]:
+            return [tracker.running(loop) for tracker in trackers]
+
+        with trackers[0].track("reveal"), trackers[1].track("reveal"):
+            seen = await flight.do("key", compute)
+
+        self.assertEqual(seen, ["reveal", "reveal"])
+
+
+if __name__ == "__main__":
+    unittest.main()
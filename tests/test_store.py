@@ -0,0 +1,125 @@
+import json
+import sqlite3
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from store import HiddenPostStore, StoredBlob
+
+POSTS = 20_000
+REFERENCED_BLOBS = 5_000
+UNREFERENCED_BLOBS = 100
+
+
+def digest(number: int) -> str:
+    return f"{number:064x}"
+
+
+class CompactTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = HiddenPostStore(str(Path(self.directory.name) / "shh.db"), ttl=60)
+
+    async def asyncTearDown(self) -> None:
+        self.store.close()
+        self.directory.cleanup()
+
+    async def freelist_count(self) -> int:
+        rows = await self.store.execute("PRAGMA freelist_count")
+        return rows[0][0]
+
+    async def test_compact_frees_pages(self) -> None:
+        for _ in range(50):
+            await self.store.create_post(content="x" * 8000, author_id="1")
+        await self.store.expire_posts(time.time() + 120, limit=100)
+
+        free = await self.freelist_count()
+        self.assertGreater(free, 20)
+
+        reclaimed = await self.store.compact(10)
+        self.assertEqual(await self.freelist_count(), free - 10)
+        self.assertGreater(reclaimed, 4096)
+
+        await self.store.compact(free)
+        self.assertEqual(await self.freelist_count(), 0)
+
+
+class UnreferencedBlobsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = HiddenPostStore(str(Path(self.directory.name) / "shh.db"), ttl=60)
+
+    async def asyncTearDown(self) -> None:
+        self.store.close()
+        self.directory.cleanup()
+
+    async def add_blobs(self, numbers: range) -> None:
+        for number in numbers:
+            await self.store.add_blob(StoredBlob(digest=digest(number), size=number))
+
+    async def test_referenced_blobs_are_kept(self) -> None:
+        await self.add_blobs(range(3))
+        post = await self.store.create_post(
+            content="hidden",
+            attachments=[digest(0), digest(0), digest(1)],
+        )
+
+        deleted = await self.store.delete_unreferenced_blobs(time.time() + 1, 10)
+        self.assertEqual([blob.digest for blob in deleted], [digest(2)])
+
+        # blobs still in their grace period are kept even when unreferenced
+        await self.store.expire_posts(post.expires_at, limit=10)
+        self.assertEqual(await self.store.delete_unreferenced_blobs(0, 10), [])
+
+        deleted = await self.store.delete_unreferenced_blobs(time.time() + 1, 10)
+        self.assertEqual(
+            sorted(blob.digest for blob in deleted),
+            [digest(0), digest(1)],
+        )
+
+    async def test_sweep_query_scales_with_posts(self) -> None:
+        now = time.time()
+        blobs = REFERENCED_BLOBS + UNREFERENCED_BLOBS
+
+        def fill(db: sqlite3.Connection) -> None:
+            db.executemany(
+                "INSERT INTO blobs (digest, size, content_type, created_at)"
+                " VALUES (?, 1, 'image/png', ?)",
+                [(digest(number), now - 3600) for number in range(blobs)],
+            )
+            db.executemany(
+                "INSERT INTO hidden_posts"
+                " (id, content, attachments, created_at, page_count, expires_at)"
+                " VALUES (?, 'hidden', ?, ?, 1, ?)",
+                [
+                    (
+                        str(post),
+                        json.dumps([digest(post % REFERENCED_BLOBS)]),
+                        now,
+                        now + 3600,
+                    )
+                    for post in range(POSTS)
+                ],
+            )
+            db.executemany(
+                "INSERT INTO post_blobs (post_id, digest) VALUES (?, ?)",
+                [(str(post), digest(post % REFERENCED_BLOBS)) for post in range(POSTS)],
+            )
+
+        await self.store.transaction(fill)
+
+        started = time.monotonic()
+        deleted = await self.store.delete_unreferenced_blobs(now, 200)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(
+            sorted(blob.digest for blob in deleted),
+            [digest(number) for number in range(REFERENCED_BLOBS, blobs)],
+        )
+        # well inside the sweeper's default time budget
+        self.assertLess(elapsed, 0.25)
+
+
+if __name__ == "__main__":
+    unittest.main()